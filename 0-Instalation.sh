@@ -3,6 +3,8 @@
 pip install loguru pymongo sentence-transformers
 pip install transformers torch sumy nltk rouge
 pip install transformers torch sentence-transformers pymongo loguru python-dotenv
+pip install "sentence-transformers[onnx]"  # Optional: EMBEDDING_BACKEND=onnx / onnx-int8
+pip install pytest mongomock  # Optional: python -m pytest tests
 
 mkdir -p core data logs
 touch core/__init__.py
@@ -3,6 +3,9 @@
 #----------------------------------------------------------------------------------------#
 import os
 import sys
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from loguru import logger
 
@@ -14,8 +17,7 @@ setup_python_path()
 
 #----------------------------------------------------------------------------------------#
 from core.config import Config
-from core.data_ingestion import DataIngestionPipeline
-from core.vectorization import VectorizationPipeline
+from core.data_ingestion import chunk_file, discover_sources, source_doc_id
 
 #----------------------------------------------------------------------------------------#
 # Configure logging
@@ -23,50 +25,85 @@ os.makedirs("logs", exist_ok=True)
 logger.add("logs/chunking.log", rotation="500 MB")
 
 #----------------------------------------------------------------------------------------#
-def process_large_text():
-    """Process Large Text into Chunks"""
+def process_source_files(pattern=Config.SOURCE_GLOB, workers=Config.INGEST_WORKERS):
+    """Chunk every matching source file in parallel, one output file per document"""
     try:
-        # Initialize pipelines
-        data_pipeline = DataIngestionPipeline()
-        vector_pipeline = VectorizationPipeline()
-        
-        # Input file path
-        input_file = os.path.join(project_root, "source", "The-Gerson-Therapy-Reduced.txt")
-        
-        # Read and chunk text
-        logger.info(f"Processing file: {input_file}")
-        text = data_pipeline.load_text(input_file)
-        
-        # Create chunks using config settings
-        chunks = data_pipeline.create_chunks(
-            text,
-            chunk_size=Config.CHUNK_SIZE,
-            overlap=Config.CHUNK_OVERLAP
-        )
-        
-        # Save chunks to JSON for verification
-        output_dir = os.path.join(project_root, "data")
+        # Resolve relative patterns against the project root
+        if not os.path.isabs(pattern):
+            pattern = os.path.join(project_root, pattern)
+        source_root = os.path.join(project_root, "source")
+
+        input_files = discover_sources(pattern)
+        if not input_files:
+            print(f"\n❌ No source files match: {pattern}")
+            return
+
+        output_dir = os.path.join(project_root, Config.CHUNKS_DIR)
         os.makedirs(output_dir, exist_ok=True)
-        output_file = os.path.join(output_dir, "large_text_chunks.json")
-        data_pipeline.save_chunks(chunks, output_file)
-        
-        logger.info(f"Created {len(chunks)} chunks")
-        logger.info(f"Saved chunks to {output_file}")
-        
-        print(f"\n✅ Successfully processed text into {len(chunks)} chunks")
-        print(f"📁 Output saved to: {output_file}")
-        
+
+        workers = workers or os.cpu_count() or 1
+        workers = min(workers, len(input_files))
+        logger.info(f"Chunking {len(input_files)} files with {workers} workers")
+        print(f"\n📚 {len(input_files)} source files, {workers} workers")
+
+        start_time = time.perf_counter()
+        total_chunks = total_bytes = 0
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for input_file in input_files:
+                doc_id = source_doc_id(input_file, source_root)
+                output_file = os.path.join(output_dir, f"{doc_id.replace('/', '__')}.{Config.CHUNK_FORMAT}")
+                future = executor.submit(
+                    chunk_file,
+                    input_file,
+                    output_file,
+                    doc_id,
+                    Config.CHUNK_MODE
+                )
+                futures[future] = input_file
+
+            for future in as_completed(futures):
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    logger.error(f"Error chunking {futures[future]}: {e}")
+                    print(f"❌ {futures[future]}: {e}")
+                    continue
+
+                seconds = max(stats["seconds"], 1e-9)
+                total_chunks += stats["chunks"]
+                total_bytes += stats["bytes"]
+                logger.info(f"Chunked {stats['doc_id']}: {stats['chunks']} chunks in {seconds:.2f}s")
+                print(f"✅ {stats['doc_id']}: {stats['chunks']} chunks, "
+                      f"{stats['bytes'] / 1e6:.1f} MB in {seconds:.2f}s "
+                      f"({stats['bytes'] / 1e6 / seconds:.1f} MB/s, {stats['chunks'] / seconds:.0f} chunks/s)")
+
+        elapsed = max(time.perf_counter() - start_time, 1e-9)
+        logger.info(f"Created {total_chunks} chunks from {len(input_files)} files in {elapsed:.2f}s")
+
+        print(f"\n✅ Successfully processed {len(input_files)} files into {total_chunks} chunks")
+        print(f"⏱️  {total_bytes / 1e6 / elapsed:.1f} MB/s, {total_chunks / elapsed:.0f} chunks/s overall")
+        print(f"📁 Output saved to: {output_dir}")
+
     except Exception as e:
         logger.error(f"Error processing text: {e}")
         print(f"\n❌ Error: {str(e)}")
 
 #----------------------------------------------------------------------------------------#
 def main():
+    parser = argparse.ArgumentParser(description="Chunk source texts in parallel")
+    parser.add_argument("--glob", default=Config.SOURCE_GLOB,
+                        help=f"Source files to chunk (default: {Config.SOURCE_GLOB})")
+    parser.add_argument("--workers", type=int, default=Config.INGEST_WORKERS,
+                        help="Worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
     print("\nText Chunking")
     print("=====================================")
-    
+
     try:
-        process_large_text()
+        process_source_files(args.glob, args.workers)
     except KeyboardInterrupt:
         print("\n👋 Process interrupted by user")
     except Exception as e:
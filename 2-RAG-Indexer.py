@@ -3,6 +3,8 @@
 #------------------------------------------------------------------#
 import os
 import sys
+import argparse
+from itertools import chain
 from pathlib import Path
 from loguru import logger
 import time
@@ -18,7 +20,9 @@ setup_python_path()
 from core.config import Config
 from core.database import Database
 from core.vectorization import VectorizationPipeline
-from core.data_ingestion import DataIngestionPipeline
+from core.data_ingestion import (DataIngestionPipeline, CHUNK_EXTENSIONS, iter_chunk_file,
+                                 read_chunk_metadata)
+from core.checkpoint import IndexCheckpoint
 
 #------------------------------------------------------------------#
 # Configure logging
@@ -29,11 +33,15 @@ logger.add("logs/indexing.log", rotation="500 MB")
 
 #------------------------------------------------------------------#
 class OrthomolecularIndexer:
-    def __init__(self, chunks_file='data/large_text_chunks.json'):
+    def __init__(self, chunks_file=Config.CHUNKS_DIR,
+                 source_file='source/The-Gerson-Therapy-Reduced.txt', resume=False,
+                 workers=Config.EMBEDDING_WORKERS):
         """Initialize indexer with core components"""
         self.chunks_file = chunks_file
+        self.source_file = source_file
+        self.resume = resume  # Continue from checkpoints of an interrupted run
         self.db = Database()
-        self.vectorizer = VectorizationPipeline()
+        self.vectorizer = VectorizationPipeline(workers=workers)
         self.data_pipeline = DataIngestionPipeline()
 
     def init_database(self):
@@ -41,8 +49,10 @@ class OrthomolecularIndexer:
         try:
             logger.info("Initializing database...")
             self.db.collection.drop()
-            self.db.collection.create_index([("chunk_id", 1)], unique=True)
-            self.db.collection.create_index([("content", "text")])
+            self.db.reset_vector_index()
+            self.vectorizer.db.reset_vector_index()
+            IndexCheckpoint.clear_all(self.db.metadata)
+            self.db.ensure_indexes()
             logger.info("Database initialized successfully!")
             return True
         except Exception as e:
@@ -50,37 +60,164 @@ class OrthomolecularIndexer:
             return False
 
     #------------------------------------------------------------------#
-    def process_chunks(self):
-        """Process and index chunks with embeddings"""
+    def chunk_files(self):
+        """Chunk files to index: a single file, or every chunk file in a directory
+        (none if the path does not exist)"""
+        if os.path.isdir(self.chunks_file):
+            return sorted(str(path) for path in Path(self.chunks_file).iterdir()
+                          if str(path).endswith(CHUNK_EXTENSIONS))
+        if os.path.isfile(self.chunks_file):
+            return [self.chunks_file]
+        return []
+
+    #------------------------------------------------------------------#
+    @staticmethod
+    def preload_vector_index(db):
+        """Load the current index so it is updated in place and re-snapshotted. An
+        empty collection has nothing to load: store_chunks fills the index lazily
+        and write_snapshot builds it from the collection"""
+        if db.collection.find_one({"embedding": {"$exists": True}}, {"_id": 1}) is not None:
+            db.vector_index
+
+    #------------------------------------------------------------------#
+    @staticmethod
+    def chunk_file_doc_id(chunk_file):
+        """doc_id of a chunk file: from its metadata, else from its first chunk"""
+        doc_id = read_chunk_metadata(chunk_file).get("doc_id")
+        if doc_id is None:
+            first = next(iter_chunk_file(chunk_file), {})
+            doc_id = first.get("doc_id", Config.DEFAULT_DOC_ID)
+        return doc_id
+
+    #------------------------------------------------------------------#
+    def process_chunks(self, dry_run=False):
+        """Incrementally index chunks: only new or changed content is embedded"""
         try:
-            # Load chunks
-            chunks = self.data_pipeline.load_data(self.chunks_file)
-            if not chunks:
+            chunk_files = self.chunk_files()
+            if not chunk_files:
+                logger.error(f"No chunk files found in {self.chunks_file}")
                 return False
 
-            # Generate embeddings using vectorization pipeline
-            self.vectorizer.process_chunks(chunks['document_chunks'])
-            logger.info("Chunks processed and stored successfully")
+            db = self.vectorizer.db
+            if not dry_run:
+                db.ensure_indexes()
+                self.preload_vector_index(db)
+
+            # One pass and one checkpoint per file, committed batch by batch
+            summary = {}
+            for chunk_file in chunk_files:
+                chunks = chain.from_iterable(self.data_pipeline.iter_chunk_batches(chunk_file))
+                file_summary = self.vectorizer.reindex_chunks(
+                    chunks,
+                    dry_run=dry_run,
+                    checkpoint=IndexCheckpoint(db.metadata, chunk_file, chunk_file),
+                    resume=self.resume
+                )
+                for key, count in file_summary.items():
+                    summary[key] = summary.get(key, 0) + count
+
+            # A directory holds every document: stored ones without a chunk file are gone
+            removed = []
+            if os.path.isdir(self.chunks_file):
+                present = {self.chunk_file_doc_id(chunk_file) for chunk_file in chunk_files}
+                removed = sorted(set(db.list_documents()) - present)
+            summary["documents_removed"] = len(removed)
+            if removed:
+                logger.info(f"Documents without a chunk file: {removed}")
+                if not dry_run:
+                    db.delete_documents(removed)
+            self.print_summary(summary, dry_run)
+
+            if not dry_run:
+                logger.info(f"Chunks from {len(chunk_files)} files processed and stored successfully")
+                if any(summary[key] for key in ("resumed", "new", "changed", "deleted",
+                                                "documents_removed")):
+                    # Write the memory-mapped snapshot query engines start from
+                    db.write_snapshot()
             return True
 
         except Exception as e:
             logger.error(f"Error processing chunks: {e}")
             return False
 
+    #------------------------------------------------------------------#
+    def dry_run(self):
+        """Report what a re-index would change without writing anything"""
+        return self.process_chunks(dry_run=True)
+
+    #------------------------------------------------------------------#
+    @staticmethod
+    def print_summary(summary, dry_run=False):
+        """Print re-index counts"""
+        print(f"\n📋 {'Dry run (nothing written)' if dry_run else 'Re-index summary'}:")
+        if summary['resumed']:
+            print(f"   Resumed (committed): {summary['resumed']}")
+        print(f"   Unchanged (skipped): {summary['unchanged']}")
+        print(f"   New:                 {summary['new']}")
+        print(f"   Changed:             {summary['changed']}")
+        print(f"   Reused embeddings:   {summary['reused']}")
+        if summary['precomputed']:
+            print(f"   Precomputed:         {summary['precomputed']}")
+        print(f"   To embed:            {summary['embedded']}")
+        print(f"   Orphans deleted:     {summary['deleted']}")
+        if summary.get('documents_removed'):
+            print(f"   Documents removed:   {summary['documents_removed']}")
+
+    #------------------------------------------------------------------#
+    def index_source(self):
+        """Stream the source text straight into embedding and storage"""
+        try:
+            token_mode = Config.CHUNK_MODE == "tokens"
+            chunks = self.data_pipeline.iter_chunks(
+                self.source_file,
+                chunk_size=Config.CHUNK_TOKENS if token_mode else Config.CHUNK_SIZE,
+                overlap=Config.CHUNK_TOKEN_OVERLAP if token_mode else Config.CHUNK_OVERLAP,
+                doc_id=Path(self.source_file).stem,
+                mode=Config.CHUNK_MODE
+            )
+            db = self.vectorizer.db
+            db.ensure_indexes()
+            self.preload_vector_index(db)
+            summary = self.vectorizer.reindex_chunks(
+                chunks,
+                checkpoint=IndexCheckpoint(db.metadata, self.source_file, self.source_file),
+                resume=self.resume
+            )
+            self.print_summary(summary)
+            logger.info("Source streamed and indexed successfully")
+
+            if any(summary[key] for key in ("resumed", "new", "changed", "deleted")):
+                db.write_snapshot()
+            return True
+
+        except Exception as e:
+            logger.error(f"Error indexing source: {e}")
+            return False
+
+    #------------------------------------------------------------------#
+    def migrate_embeddings(self):
+        """Convert stored embeddings to the configured storage format"""
+        try:
+            logger.info(f"Migrating embeddings to '{Config.EMBEDDING_STORAGE}' storage")
+            self.db.migrate_embeddings(Config.EMBEDDING_STORAGE)
+            return True
+        except Exception as e:
+            logger.error(f"Error migrating embeddings: {e}")
+            return False
+
     #------------------------------------------------------------------#
     def run_all_operations(self):
         """Run all operations in sequence"""
         try:
             logger.info("Starting all operations...")
             
-            # Initialize database
-            print("\n🔄 Initializing database...")
-            if not self.init_database():
-                raise Exception("Database initialization failed")
-            print("✅ Database initialized successfully")
+            # Ensure indices without dropping, so search stays available
+            print("\n🔄 Checking database indices...")
+            self.db.ensure_indexes()
+            print("✅ Database ready")
             
             # Process chunks
-            print("\n🔄 Processing chunks and creating embeddings...")
+            print("\n🔄 Re-indexing chunks (only new or changed content is embedded)...")
             if not self.process_chunks():
                 raise Exception("Chunk processing failed")
             print("✅ Chunks processed successfully")
@@ -102,14 +239,33 @@ def display_header():
 
 #------------------------------------------------------------------#
 def main():
+    parser = argparse.ArgumentParser(description="Index chunks into MongoDB")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run from its checkpoints and exit")
+    parser.add_argument("--workers", type=int, default=Config.EMBEDDING_WORKERS,
+                        help="Embedding worker processes for bulk indexing (default: in-process)")
+    args = parser.parse_args()
+
     display_header()
-    indexer = OrthomolecularIndexer()
+    indexer = OrthomolecularIndexer(resume=args.resume, workers=args.workers)
+
+    if args.resume:
+        print("\n🔄 Resuming indexing from checkpoints...")
+        start_time = time.time()
+        if not indexer.process_chunks():
+            print("\n❌ Operation failed")
+            sys.exit(1)
+        print(f"\n✅ Operation completed in {time.time() - start_time:.2f} seconds")
+        sys.exit(0)
 
     menu_options = {
         "1": ("Initialize database (will delete existing data)", indexer.init_database),
-        "2": ("Process chunks and create embeddings", indexer.process_chunks),
+        "2": ("Re-index chunks (embed only new or changed chunks)", indexer.process_chunks),
         "3": ("Run all operations and exit", lambda: run_all_and_exit(indexer)),
-        "4": ("Exit", lambda: sys.exit(0))
+        "4": (f"Convert stored embeddings to '{Config.EMBEDDING_STORAGE}' storage", indexer.migrate_embeddings),
+        "5": ("Stream source text straight into the index", indexer.index_source),
+        "6": ("Dry run: show what a re-index would change", indexer.dry_run),
+        "7": ("Exit", lambda: sys.exit(0))
     }
 
     #------------------------------------------------------------------#
@@ -126,14 +282,14 @@ def main():
             for key, (description, _) in menu_options.items():
                 print(f"{key}. {description}")
 
-            choice = input("\nEnter your choice (1-4): ")
+            choice = input(f"\nEnter your choice (1-{len(menu_options)}): ")
 
             if choice in menu_options:
                 start_time = time.time()
                 result = menu_options[choice][1]()
                 end_time = time.time()
                 
-                if choice != "4":
+                if choice != "7":
                     if result:
                         print(f"\n✅ Operation completed in {end_time - start_time:.2f} seconds")
                     else:
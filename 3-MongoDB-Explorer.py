@@ -5,6 +5,7 @@ import numpy as np
 from loguru import logger
 from core.config import Config
 from core.database import Database
+from core.embedding_codec import decode_embedding, storage_format
 
 # Display Configuration
 DISPLAY_CONFIG = {
@@ -16,10 +17,12 @@ DISPLAY_CONFIG = {
 }
 
 def format_embedding(embedding, num_values=DISPLAY_CONFIG['num_embeddings']):
-    """Format embedding vector preview"""
-    if isinstance(embedding, (list, np.ndarray)):
-        values = [f"{x:.4f}" for x in embedding[:num_values]]
-        return f"[{', '.join(values)}... ({len(embedding)} dims)]"
+    """Format embedding vector preview (decodes Binary float16/int8 storage)"""
+    if isinstance(embedding, (list, np.ndarray, bytes)):
+        storage = storage_format(embedding)
+        vector = decode_embedding(embedding)
+        values = [f"{x:.4f}" for x in vector[:num_values]]
+        return f"[{', '.join(values)}... ({len(vector)} dims, {storage})]"
     return str(embedding)
 
 def truncate_text(text, max_length=DISPLAY_CONFIG['content_length']):
@@ -30,7 +33,7 @@ def truncate_text(text, max_length=DISPLAY_CONFIG['content_length']):
 
 def format_value(value):
     """Format display values with type-specific handling"""
-    if isinstance(value, (list, np.ndarray)):
+    if isinstance(value, (list, np.ndarray, bytes)):
         return format_embedding(value)
     elif isinstance(value, dict):
         return f"<dict: {str(value)[:DISPLAY_CONFIG['content_length']]}...>"
@@ -50,11 +53,14 @@ def explore_database():
         print("\n✅ Connected to MongoDB")
         total_chunks = db.collection.count_documents({})
         print(f"📚 Total chunks: {total_chunks}")
+        for doc_id, count in db.list_documents().items():
+            print(f"   📖 {doc_id}: {count} chunks")
 
         # Get random samples with all fields
         pipeline = [
             {"$sample": {"size": DISPLAY_CONFIG['num_samples']}},
             {"$project": {
+                "doc_id": 1,
                 "chunk_id": 1,
                 "content": 1,
                 "start_char": 1,
@@ -90,7 +96,7 @@ def explore_database():
             if 'start_char' in sample and 'end_char' in sample:
                 sample['span'] = f"{sample['start_char']} -> {sample['end_char']}"
 
-            fields = ['chunk_id', 'content', 'length', 'span', 'embedding']
+            fields = ['doc_id', 'chunk_id', 'content', 'length', 'span', 'embedding']
             for field in fields:
                 if field in sample:
                     try:
@@ -79,29 +79,23 @@ class OrthomolecularSearchCLI:
         table.add_row([formatted_content])
         return table
 
-    def print_results(self, results, query, generated_response):
-        """Print formatted search results and response"""
+    def print_results(self, results, mode=None):
+        """Print formatted search results. Hybrid scores are reciprocal-rank fusion
+        scores (around 1/RRF_K), not cosine similarities, and are labelled as such"""
         print("\n📚 Search Results:")
         print("=" * self.CONTENT_WIDTH)
-        
-        # Print response with same width as chunks
-        response_block = self.format_text_block(
-            "Generated Response",
-            generated_response,
-            width=self.CONTENT_WIDTH
-        )
-        print("\n" + str(response_block))
-        
+        score_label = "RRF score" if (mode or Config.SEARCH_MODE) == "hybrid" else "Similarity"
+
         # Print results
-        # print("\nMatching Text Chunks:")
         for i, result in enumerate(results, 1):
             score    = result.get('score', 0.0)
             chunk_id = result.get('chunk_id', 'N/A')
+            doc_id   = result.get('doc_id', 'N/A')
             content  = result.get('content', '')[:500]
             
             chunk_text = (
-                f"Chunk {i} (Similarity: {score:.4f})\n"
-                f"ID: {chunk_id}\n"
+                f"Chunk {i} ({score_label}: {score:.4f})\n"
+                f"ID: {doc_id} #{chunk_id}\n"
                 f"Content:\n{content}..."
             )
             
@@ -112,6 +106,24 @@ class OrthomolecularSearchCLI:
             )
             print("\n" + str(chunk_block))
 
+    async def stream_response(self, query, results):
+        """Print the generated response as it is produced, wrapped at the content width"""
+        print("\nGenerated Response")
+        print("-" * self.CONTENT_WIDTH)
+        column = 0
+        async for piece in self.query_engine.generate_response_stream(query, results):
+            for i, part in enumerate(piece.split("\n")):
+                if i > 0:
+                    print()
+                    column = 0
+                if column and column + len(part) > self.CONTENT_WIDTH and part.startswith(" "):
+                    print()
+                    part = part.lstrip()
+                    column = 0
+                print(part, end="", flush=True)
+                column += len(part)
+        print("\n" + "=" * self.CONTENT_WIDTH)
+
     async def search_loop(self):
         """Interactive search loop"""
         # Print combined header
@@ -130,14 +142,12 @@ class OrthomolecularSearchCLI:
 
                 print("\n🔎 Searching...")
                 
-                # Perform search
+                # Perform search and show the chunks before generation starts
                 results = await self.query_engine.search(query, top_k=Config.TOP_K)
-                
-                # Generate response
-                response = await self.query_engine.generate_response(query, results)
-                
-                # Display results
-                self.print_results(results, query, response)
+                self.print_results(results)
+
+                # Stream the generated response
+                await self.stream_response(query, results)
                 
             except Exception as e:
                 logger.error(f"Search error: {e}")
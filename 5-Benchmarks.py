@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+#------------------------------------------------------------------#
+import os
+import sys
+from pathlib import Path
+from loguru import logger
+import time
+
+#------------------------------------------------------------------#
+# Get project root and setup Python path
+project_root = Path(__file__).parent.absolute()
+from utils import setup_python_path
+setup_python_path()
+
+#------------------------------------------------------------------#
+from prettytable import PrettyTable
+
+# Core imports
+from core.config import Config
+from core.database import Database
+from core.vector_index import VectorIndex
+from core.ann_index import IVFIndex, recall_report
+from core.embedding_backend import parity_report
+from core.generation import compare_profiles
+
+#------------------------------------------------------------------#
+# Configure logging
+os.makedirs("logs", exist_ok=True)
+logger.remove()
+logger.add(sys.stderr,
+          format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>")
+logger.add("logs/benchmarks.log", rotation="500 MB")
+
+#------------------------------------------------------------------#
+def ann_recall_report():
+    """Compare IVF recall@k and latency against exact search"""
+    try:
+        db = Database()
+        exact = VectorIndex.from_collection(db.collection)
+        if len(exact) == 0:
+            print("\nNo embeddings found - run 2-RAG-Indexer.py first")
+            return False
+
+        if os.path.exists(Config.IVF_INDEX_PATH):
+            ann = IVFIndex.load(Config.IVF_INDEX_PATH)
+        else:
+            ann = IVFIndex.from_vector_index(exact)
+
+        nprobe_values = sorted({n for n in (1, 2, 4, 8, 16, 32, 64, Config.IVF_NPROBE)
+                                if n <= len(ann.centroids)})
+        report = recall_report(exact, ann, nprobe_values, top_k=Config.TOP_K)
+
+        table = PrettyTable()
+        table.field_names = ["Method", "nprobe", f"Recall@{Config.TOP_K}", "p50 (ms)", "p99 (ms)"]
+        table.align = "r"
+        for row in report:
+            table.add_row([
+                row["method"],
+                row["nprobe"],
+                f"{row['recall']:.3f}",
+                f"{row['p50_ms']:.3f}",
+                f"{row['p99_ms']:.3f}"
+            ])
+
+        print(f"\n📊 {len(exact)} chunks, {len(ann.centroids)} IVF lists")
+        print(table)
+        return True
+
+    except Exception as e:
+        logger.error(f"Error running ANN report: {e}")
+        return False
+
+#------------------------------------------------------------------#
+def embedding_parity_report(num_texts=200):
+    """Compare ONNX / int8 embeddings and encode speed against torch"""
+    try:
+        db = Database()
+        texts = [doc["content"] for doc in db.collection.aggregate([
+            {"$sample": {"size": num_texts}}, {"$project": {"_id": 0, "content": 1}}
+        ])]
+        if not texts:
+            print("\nNo chunks found - run 2-RAG-Indexer.py first")
+            return False
+
+        report = parity_report(texts)
+
+        table = PrettyTable()
+        table.field_names = ["Backend", "Mean cosine", "Min cosine", "Texts/s",
+                             "Query p50 (ms)", "Query p99 (ms)"]
+        table.align = "r"
+        for row in report:
+            table.add_row([
+                row["backend"],
+                f"{row['mean_cosine']:.5f}",
+                f"{row['min_cosine']:.5f}",
+                f"{row['texts_per_s']:.1f}",
+                f"{row['p50_ms']:.2f}",
+                f"{row['p99_ms']:.2f}"
+            ])
+
+        print(f"\n📊 Embedding backend parity on {len(texts)} stored chunks")
+        print(table)
+        return True
+
+    except Exception as e:
+        logger.error(f"Error running parity report: {e}")
+        return False
+
+#------------------------------------------------------------------#
+def generation_profile_report(num_contexts=10):
+    """Compare generation profiles' latency and ROUGE against the full-beam output"""
+    try:
+        db = Database()
+        # A context is a sampled chunk and the chunks following it, like a retrieval result
+        contexts = []
+        for start in db.collection.aggregate([
+            {"$sample": {"size": num_contexts}}, {"$project": {"doc_id": 1, "chunk_id": 1}}
+        ]):
+            chunks = list(db.collection.find(
+                {"doc_id": start.get("doc_id"), "chunk_id": {"$gte": start["chunk_id"]}},
+                {"_id": 0, "doc_id": 1, "chunk_id": 1, "content": 1, "start_char": 1, "end_char": 1}
+            ).sort("chunk_id", 1).limit(Config.TOP_K))
+            contexts.append(chunks)
+        if not contexts:
+            print("\nNo chunks found - run 2-RAG-Indexer.py first")
+            return False
+
+        report = compare_profiles(contexts)
+
+        table = PrettyTable()
+        table.field_names = ["Profile", "Model", "int8", "Beams", "Mean (s)", "p90 (s)",
+                             "ROUGE-1", "ROUGE-2", "ROUGE-L"]
+        table.align = "r"
+        for row in report:
+            table.add_row([
+                row["profile"],
+                row["model"],
+                "yes" if row["quantize"] else "no",
+                row["num_beams"],
+                f"{row['mean_s']:.2f}",
+                f"{row['p90_s']:.2f}",
+                f"{row['rouge1']:.3f}",
+                f"{row['rouge2']:.3f}",
+                f"{row['rougeL']:.3f}"
+            ])
+
+        print(f"\n📊 Generation profiles on {len(contexts)} contexts of {Config.TOP_K} chunks "
+              f"(ROUGE F1 against '{report[0]['profile']}')")
+        print(table)
+        return True
+
+    except Exception as e:
+        logger.error(f"Error running generation report: {e}")
+        return False
+
+#------------------------------------------------------------------#
+def display_header():
+    """Display the application header"""
+    print("\n" + "="*50)
+    print("⏱️  Orthomolecular Medicine Benchmarks")
+    print("="*50)
+
+#------------------------------------------------------------------#
+def main():
+    display_header()
+
+    menu_options = {
+        "1": ("ANN recall vs latency report", ann_recall_report),
+        "2": ("Embedding backend parity (torch vs ONNX / int8)", embedding_parity_report),
+        "3": ("Generation profiles (latency vs ROUGE)", generation_profile_report),
+        "4": ("Exit", lambda: sys.exit(0))
+    }
+
+    while True:
+        try:
+            print("\nOptions:")
+            for key, (description, _) in menu_options.items():
+                print(f"{key}. {description}")
+
+            choice = input(f"\nEnter your choice (1-{len(menu_options)}): ")
+
+            if choice in menu_options:
+                start_time = time.time()
+                result = menu_options[choice][1]()
+                end_time = time.time()
+
+                if result:
+                    print(f"\n✅ Report completed in {end_time - start_time:.2f} seconds")
+                else:
+                    print("\n❌ Report failed")
+            else:
+                print("\n❌ Invalid choice. Please try again.")
+
+        except KeyboardInterrupt:
+            print("\n👋 Exiting...")
+            break
+        except Exception as e:
+            logger.error(f"Error: {e}")
+            print(f"\n❌ Error: {str(e)}")
+
+#------------------------------------------------------------------#
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#---------------------------------------------------------------------------------------#
+# ann_index.py
+#---------------------------------------------------------------------------------------#
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from loguru import logger
+import numpy as np
+from core.config import Config
+from core.vector_index import ChunkKey, VectorIndex, normalize_rows
+
+#---------------------------------------------------------------------------------------#
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = Config.IVF_TRAIN_ITERATIONS,
+                    sample_size: int = 256, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over (a sample of) the normalized vectors"""
+    rng = np.random.default_rng(seed)
+    nlist = max(1, min(nlist, len(vectors)))
+
+    if len(vectors) > nlist * sample_size:
+        vectors = vectors[rng.choice(len(vectors), nlist * sample_size, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=nlist)
+
+        # Re-seed empty lists from random vectors so every list stays usable
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+#---------------------------------------------------------------------------------------#
+class IVFIndex:
+    """IVF-flat approximate index: vectors are bucketed by their nearest centroid and
+    a query only scans the nprobe closest buckets.
+
+    Lists hold integer labels; `keys[label]` is the (doc_id, chunk_id) of a label and
+    `label_docs[label]` its document code. A document-filtered query skips the
+    probing and scans exactly the lists holding the selected documents' chunks
+    (found through `doc_labels`), so small documents keep full recall.
+
+    An index without centroids is untrained: it keeps every vector in a single list
+    and searches it exactly, and trains itself once it holds IVF_MIN_TRAIN_SIZE
+    vectors. An empty collection therefore gets a working (empty) index.
+    """
+
+    def __init__(self, centroids: np.ndarray, nprobe: int = Config.IVF_NPROBE):
+        self.centroids = normalize_rows(centroids)
+        self.nprobe = nprobe
+        self.version = None  # Embeddings version the index was saved at
+        dim = self.centroids.shape[1]
+        lists = max(1, len(self.centroids))
+        self.list_ids = [np.zeros(0, dtype=np.int64) for _ in range(lists)]
+        self.list_vectors = [np.zeros((0, dim), dtype=np.float32) for _ in range(lists)]
+        self.keys: List[ChunkKey] = []
+        self.label_docs = np.zeros(0, dtype=np.int32)
+        self._label_doc_codes: List[int] = []
+        self.doc_codes: Dict[str, int] = {}
+        self.doc_labels: Dict[int, List[int]] = {}  # Document code -> its labels
+        self._labels: Dict[ChunkKey, int] = {}
+        self._assignment: Dict[int, int] = {}
+        self.nlist = Config.IVF_NLIST  # Lists to train (None = 4 * sqrt(chunk count))
+
+    #----------------------------------------------------------------------------------#
+    @classmethod
+    def train(cls, keys: Sequence[ChunkKey], embeddings, nlist: Optional[int] = Config.IVF_NLIST,
+              nprobe: int = Config.IVF_NPROBE) -> "IVFIndex":
+        """Train centroids on the given embeddings and add all of them. With fewer
+        than IVF_MIN_TRAIN_SIZE embeddings the index is left untrained"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if not len(vectors):
+            vectors = np.zeros((0, Config.VECTOR_DIMENSION), dtype=np.float32)
+        vectors = normalize_rows(vectors)
+        index = cls(np.zeros((0, vectors.shape[1]), dtype=np.float32), nprobe=nprobe)
+        index.nlist = nlist
+        index.upsert(keys, vectors)
+        return index
+
+    #----------------------------------------------------------------------------------#
+    @property
+    def trained(self) -> bool:
+        return len(self.centroids) > 0
+
+    #----------------------------------------------------------------------------------#
+    def _train(self):
+        """Train centroids on every vector held so far and redistribute them"""
+        labels = np.concatenate(self.list_ids)
+        vectors = np.vstack(self.list_vectors)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(len(vectors))))
+
+        start = time.time()
+        self.centroids = train_centroids(vectors, nlist)
+        self.list_ids = [np.zeros(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        self.list_vectors = [np.zeros((0, vectors.shape[1]), dtype=np.float32)
+                             for _ in range(len(self.centroids))]
+        self._assignment = {}
+        self._assign(labels.tolist(), vectors)
+        logger.info(f"Trained IVF index: {len(self)} chunks, {len(self.centroids)} lists "
+                    f"in {time.time() - start:.2f}s")
+
+    #----------------------------------------------------------------------------------#
+    @classmethod
+    def from_vector_index(cls, exact: VectorIndex, nlist: Optional[int] = Config.IVF_NLIST,
+                          nprobe: int = Config.IVF_NPROBE) -> "IVFIndex":
+        """Build an IVF index from an already-loaded exact index"""
+        return cls.train(exact.keys(), exact.vectors(), nlist=nlist, nprobe=nprobe)
+
+    #----------------------------------------------------------------------------------#
+    def __len__(self) -> int:
+        return len(self._assignment)
+
+    #----------------------------------------------------------------------------------#
+    def _label(self, key: ChunkKey) -> int:
+        """Label of a chunk key, allocating one for unseen keys"""
+        label = self._labels.get(key)
+        if label is None:
+            label = len(self.keys)
+            self._labels[key] = label
+            self.keys.append(key)
+            code = self.doc_codes.setdefault(key[0], len(self.doc_codes))
+            self._label_doc_codes.append(code)
+            self.doc_labels.setdefault(code, []).append(label)
+        return label
+
+    #----------------------------------------------------------------------------------#
+    def upsert(self, keys: Iterable[ChunkKey], embeddings):
+        """Assign new or changed embeddings to their nearest list. Only an untrained
+        index trains, once it reaches IVF_MIN_TRAIN_SIZE vectors"""
+        keys = list(keys)
+        if not keys:
+            return
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        labels = [self._label(key) for key in keys]
+        self.label_docs = np.asarray(self._label_doc_codes, dtype=np.int32)
+
+        # Drop replaced labels from whichever list currently holds them
+        self._unassign(labels)
+        self._assign(labels, vectors)
+        if not self.trained and len(self) >= Config.IVF_MIN_TRAIN_SIZE:
+            self._train()
+
+    #----------------------------------------------------------------------------------#
+    def _assign(self, labels: List[int], vectors: np.ndarray):
+        """Append labelled vectors to their nearest list (the single list if untrained)"""
+        if self.trained:
+            assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        else:
+            assignment = np.zeros(len(labels), dtype=np.int64)
+        ids = np.asarray(labels, dtype=np.int64)
+        for list_no in np.unique(assignment):
+            rows = assignment == list_no
+            self.list_ids[list_no] = np.concatenate([self.list_ids[list_no], ids[rows]])
+            self.list_vectors[list_no] = np.vstack([self.list_vectors[list_no], vectors[rows]])
+        for label, list_no in zip(labels, assignment.tolist()):
+            self._assignment[label] = list_no
+
+    #----------------------------------------------------------------------------------#
+    def _unassign(self, labels: Iterable[int]):
+        """Remove labels from the lists that currently hold them"""
+        stale: Dict[int, List[int]] = {}
+        for label in labels:
+            if label in self._assignment:
+                stale.setdefault(self._assignment.pop(label), []).append(label)
+        for list_no, ids in stale.items():
+            keep = ~np.isin(self.list_ids[list_no], ids)
+            self.list_ids[list_no] = self.list_ids[list_no][keep]
+            self.list_vectors[list_no] = self.list_vectors[list_no][keep]
+
+    #----------------------------------------------------------------------------------#
+    def remove(self, keys: Iterable[ChunkKey]):
+        """Drop deleted chunks (their labels stay reserved for a later re-insert)"""
+        self._unassign(self._labels[key] for key in keys if key in self._labels)
+
+    #----------------------------------------------------------------------------------#
+    def search(self, query_embedding, top_k: int = Config.TOP_K, nprobe: Optional[int] = None,
+               documents: Optional[Iterable[str]] = None) -> List[Tuple[ChunkKey, float]]:
+        """Return approximate (chunk key, cosine score) pairs for the top_k chunks"""
+        if len(self) == 0 or top_k <= 0:
+            return []
+
+        query = normalize_rows(np.asarray(query_embedding, dtype=np.float32))
+        if documents is not None:
+            # Exact over the selected documents: only lists holding their chunks
+            codes = [self.doc_codes[d] for d in documents if d in self.doc_codes]
+            probes = sorted({self._assignment[label] for code in codes
+                             for label in self.doc_labels[code] if label in self._assignment})
+        elif not self.trained:
+            probes = [0]
+        else:
+            nprobe = min(nprobe or self.nprobe, len(self.centroids))
+            probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        if len(probes) == 0:
+            return []
+
+        ids = np.concatenate([self.list_ids[p] for p in probes])
+        vectors = np.vstack([self.list_vectors[p] for p in probes])
+        if documents is not None:
+            mask = np.isin(self.label_docs[ids], codes)
+            ids, vectors = ids[mask], vectors[mask]
+        if len(ids) == 0:
+            return []
+        scores = vectors @ query
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.keys[ids[row]], float(scores[row])) for row in top]
+
+    #----------------------------------------------------------------------------------#
+    def search_many(self, query_embeddings, top_k: int = Config.TOP_K, nprobe: Optional[int] = None,
+                    documents: Optional[Iterable[str]] = None) -> List[List[Tuple[ChunkKey, float]]]:
+        """Search a batch of queries (each probes its own lists)"""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        return [self.search(query, top_k, nprobe=nprobe, documents=documents) for query in queries]
+
+    #----------------------------------------------------------------------------------#
+    def save(self, path: str = Config.IVF_INDEX_PATH, version: Optional[int] = None):
+        """Persist the index as a single .npz file (written atomically)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        sizes = np.asarray([len(ids) for ids in self.list_ids], dtype=np.int64)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            list_sizes=sizes,
+            ids=np.concatenate(self.list_ids),
+            vectors=np.vstack(self.list_vectors),
+            key_docs=np.asarray([doc_id for doc_id, _ in self.keys], dtype=str),
+            key_chunks=np.asarray([chunk_id for _, chunk_id in self.keys], dtype=np.int64),
+            nprobe=np.int64(self.nprobe),
+            version=np.int64(-1 if version is None else version)
+        )
+        os.replace(tmp_path, path)
+        self.version = version
+        logger.info(f"Saved IVF index to {path}")
+
+    #----------------------------------------------------------------------------------#
+    @staticmethod
+    def saved_version(path: str = Config.IVF_INDEX_PATH) -> Optional[int]:
+        """Embeddings version a saved index was written at, without loading it (None if
+        there is no saved index)"""
+        try:
+            with np.load(path) as data:
+                version = int(data["version"])
+        except FileNotFoundError:
+            return None
+        return version if version >= 0 else None
+
+    #----------------------------------------------------------------------------------#
+    @classmethod
+    def load(cls, path: str = Config.IVF_INDEX_PATH) -> "IVFIndex":
+        """Load an index previously written by save()"""
+        with np.load(path) as data:
+            index = cls(data["centroids"], nprobe=int(data["nprobe"]))
+            if int(data["version"]) >= 0:
+                index.version = int(data["version"])
+            bounds = np.concatenate([[0], np.cumsum(data["list_sizes"])])
+            ids, vectors = data["ids"], data["vectors"]
+            key_docs, key_chunks = data["key_docs"].tolist(), data["key_chunks"].tolist()
+
+        for key in zip(key_docs, key_chunks):
+            index._label(key)
+        index.label_docs = np.asarray(index._label_doc_codes, dtype=np.int32)
+
+        for list_no in range(len(index.list_ids)):
+            start, end = bounds[list_no], bounds[list_no + 1]
+            index.list_ids[list_no] = ids[start:end]
+            index.list_vectors[list_no] = vectors[start:end]
+            for label in ids[start:end].tolist():
+                index._assignment[label] = list_no
+
+        logger.info(f"Loaded IVF index from {path}: {len(index)} chunks")
+        return index
+
+#---------------------------------------------------------------------------------------#
+def recall_report(exact: VectorIndex, ann: IVFIndex, nprobe_values: Sequence[int],
+                  num_queries: int = 200, top_k: int = Config.TOP_K, seed: int = 0) -> List[dict]:
+    """Measure recall@k and per-query latency of the IVF index against exact search,
+    using stored chunk embeddings as queries"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(exact), min(num_queries, len(exact)), replace=False)
+    queries = exact.vectors()[rows]
+
+    def timed(search):
+        latencies, results = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results.append({key for key, _ in search(query)})
+            latencies.append((time.perf_counter() - start) * 1000)
+        return results, np.asarray(latencies)
+
+    truth, exact_ms = timed(lambda q: exact.search(q, top_k))
+    report = [{
+        "method": "exact",
+        "nprobe": "-",
+        "recall": 1.0,
+        "p50_ms": float(np.percentile(exact_ms, 50)),
+        "p99_ms": float(np.percentile(exact_ms, 99))
+    }]
+
+    for nprobe in nprobe_values:
+        found, ann_ms = timed(lambda q: ann.search(q, top_k, nprobe=nprobe))
+        hits = sum(len(t & f) for t, f in zip(truth, found))
+        report.append({
+            "method": "ivf",
+            "nprobe": nprobe,
+            "recall": hits / max(1, sum(len(t) for t in truth)),
+            "p50_ms": float(np.percentile(ann_ms, 50)),
+            "p99_ms": float(np.percentile(ann_ms, 99))
+        })
+
+    return report
+
+#---------------------------------------------------------------------------------------#
@@ -0,0 +1,343 @@
+#---------------------------------------------------------------------------------------#
+# cache.py
+#---------------------------------------------------------------------------------------#
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+from loguru import logger
+import numpy as np
+from core.config import Config
+
+#---------------------------------------------------------------------------------------#
+def model_key() -> str:
+    """Model column of the embedding caches. Backends do not produce bit-identical
+    vectors, so they are cached apart; torch keeps the bare model name"""
+    if Config.EMBEDDING_BACKEND == "torch":
+        return Config.MODEL_NAME
+    return f"{Config.MODEL_NAME}:{Config.EMBEDDING_BACKEND}"
+
+#---------------------------------------------------------------------------------------#
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings keyed on normalized query text and model
+    (with its backend, see model_key).
+
+    With a path, entries are also kept in SQLite so the cache survives restarts.
+    """
+
+    def __init__(self, max_size: int = Config.QUERY_CACHE_SIZE,
+                 path: Optional[str] = Config.QUERY_CACHE_PATH,
+                 model_name: Optional[str] = None):
+        self.max_size = max_size
+        self.model_name = model_name or model_key()
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " model TEXT NOT NULL, query TEXT NOT NULL, embedding BLOB NOT NULL,"
+                " last_used REAL NOT NULL, PRIMARY KEY (model, query))"
+            )
+            self._conn.commit()
+            logger.info(f"Query embedding cache persisted to {path}")
+
+    #----------------------------------------------------------------------------------#
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Cache key text: case-folded with whitespace collapsed"""
+        return " ".join(query.lower().split())
+
+    #----------------------------------------------------------------------------------#
+    def get(self, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for a query, or None"""
+        key = self.normalize(query)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+            elif self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT embedding FROM query_embeddings WHERE model = ? AND query = ?",
+                    (self.model_name, key)
+                ).fetchone()
+                if row is not None:
+                    embedding = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, embedding)
+                    self._touch(key)
+
+            if embedding is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return embedding
+
+    #----------------------------------------------------------------------------------#
+    def put(self, query: str, embedding):
+        """Cache a query embedding, evicting the least recently used entries"""
+        key = self.normalize(query)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, embedding)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?)",
+                    (self.model_name, key, embedding.tobytes(), time.time())
+                )
+                self._conn.execute(
+                    "DELETE FROM query_embeddings WHERE rowid IN ("
+                    " SELECT rowid FROM query_embeddings WHERE model = ?"
+                    " ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.model_name, self.max_size)
+                )
+                self._conn.commit()
+
+    #----------------------------------------------------------------------------------#
+    def _remember(self, key: str, embedding: np.ndarray):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    #----------------------------------------------------------------------------------#
+    def _touch(self, key: str):
+        self._conn.execute(
+            "UPDATE query_embeddings SET last_used = ? WHERE model = ? AND query = ?",
+            (time.time(), self.model_name, key)
+        )
+        self._conn.commit()
+
+    #----------------------------------------------------------------------------------#
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    #----------------------------------------------------------------------------------#
+    def close(self):
+        """Close the SQLite store, if any"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+#---------------------------------------------------------------------------------------#
+class ChunkEmbeddingCache:
+    """SQLite store of chunk embeddings keyed on (model, content hash).
+
+    Lets a rebuilt or re-chunked collection reuse embeddings of byte-identical
+    chunk text instead of encoding it again. Holds at most `max_size` entries;
+    the least recently used are evicted.
+    """
+
+    def __init__(self, path: str = Config.EMBEDDING_CACHE_PATH,
+                 max_size: int = Config.EMBEDDING_CACHE_SIZE,
+                 model_name: Optional[str] = None):
+        self.path = path
+        self.max_size = max_size
+        self.model_name = model_name or model_key()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            " model TEXT NOT NULL, content_hash TEXT NOT NULL, embedding BLOB NOT NULL,"
+            " last_used REAL NOT NULL, PRIMARY KEY (model, content_hash))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunk_embeddings_last_used ON chunk_embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+        logger.info(f"Chunk embedding cache: {path} ({self._size} entries)")
+
+    #----------------------------------------------------------------------------------#
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Cached embeddings of the given content hashes (misses are left out)"""
+        hashes = list(dict.fromkeys(hashes))
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            # Stay under SQLite's bound-variable limit
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT content_hash, embedding FROM chunk_embeddings"
+                    f" WHERE model = ? AND content_hash IN ({','.join('?' * len(part))})",
+                    (self.model_name, *part)
+                ).fetchall()
+                found.update((h, np.frombuffer(blob, dtype=np.float32)) for h, blob in rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE chunk_embeddings SET last_used = ? WHERE model = ? AND content_hash = ?",
+                    [(now, self.model_name, h) for h in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    #----------------------------------------------------------------------------------#
+    def put_many(self, embeddings: Dict[str, np.ndarray]):
+        """Cache embeddings by content hash, evicting the least recently used entries"""
+        if not embeddings:
+            return
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_embeddings VALUES (?, ?, ?, ?)",
+                [(self.model_name, h, np.asarray(e, dtype=np.float32).tobytes(), now)
+                 for h, e in embeddings.items()]
+            )
+            self._size += self._conn.total_changes - before
+            if self._size > self.max_size:
+                excess = self._size - self.max_size
+                self._conn.execute(
+                    "DELETE FROM chunk_embeddings WHERE rowid IN ("
+                    " SELECT rowid FROM chunk_embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+                self._size -= excess
+                self.evicted += excess
+            self._conn.commit()
+
+    #----------------------------------------------------------------------------------#
+    def stats(self) -> dict:
+        """Hit/miss counters, evictions and current size"""
+        total = self.hits + self.misses
+        return {
+            "size": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    #----------------------------------------------------------------------------------#
+    def close(self):
+        """Close the SQLite store"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+#---------------------------------------------------------------------------------------#
+class AnswerCache:
+    """Cache of generated answers keyed on the set of retrieved (doc_id, chunk_id)
+    keys. Retrieval order is left out: the context orders passages by score itself,
+    so the same chunks in another order produce the same answer.
+
+    Near-duplicate questions also hit when their query embedding is within
+    `threshold` cosine similarity of a cached one drawn from the same documents.
+    Entries expire after `ttl` seconds, and the whole cache is dropped when the
+    embeddings version changes (i.e. the chunks were re-indexed).
+    """
+
+    def __init__(self, max_size: int = Config.ANSWER_CACHE_SIZE,
+                 ttl: float = Config.ANSWER_CACHE_TTL,
+                 threshold: float = Config.ANSWER_CACHE_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[frozenset, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    #----------------------------------------------------------------------------------#
+    def _check_version(self, version):
+        if version != self.version:
+            if self._entries:
+                logger.info(f"Answer cache invalidated (embeddings v{self.version} -> v{version})")
+            self._entries.clear()
+            self.version = version
+
+    #----------------------------------------------------------------------------------#
+    @staticmethod
+    def _scope(key: frozenset) -> frozenset:
+        return frozenset(doc_id for doc_id, _ in key)
+
+    #----------------------------------------------------------------------------------#
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for key in [key for key, (_, _, created, _) in self._entries.items() if created < cutoff]:
+            del self._entries[key]
+
+    #----------------------------------------------------------------------------------#
+    def get(self, chunk_keys, query_embedding, version, exact: bool = True) -> Optional[str]:
+        """Return a cached answer for these chunks or a near-duplicate query. With
+        exact=False (answers that depend on the query, not only on the chunks) only
+        a near-duplicate query can hit"""
+        key = frozenset(chunk_keys)
+        with self._lock:
+            self._check_version(version)
+            self._expire()
+
+            entry = self._entries.get(key) if exact else None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            # Only consider answers built from the same documents (e.g. a filtered search)
+            scope = self._scope(key)
+            keys = [k for k, entry in self._entries.items() if entry[3] == scope]
+            if keys and query_embedding is not None:
+                cached = np.stack([self._entries[k][1] for k in keys])
+                query = np.asarray(query_embedding, dtype=np.float32)
+                scores = cached @ query / (np.linalg.norm(cached, axis=1) * np.linalg.norm(query) + 1e-12)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.semantic_hits += 1
+                    return self._entries[keys[best]][0]
+
+            self.misses += 1
+            return None
+
+    #----------------------------------------------------------------------------------#
+    def put(self, chunk_keys, query_embedding, answer: str, version):
+        """Cache an answer, evicting the least recently used entries"""
+        key = frozenset(chunk_keys)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (answer, np.asarray(query_embedding, dtype=np.float32), time.time(),
+                                  self._scope(key))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    #----------------------------------------------------------------------------------#
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses
+        }
+
+#---------------------------------------------------------------------------------------#
@@ -0,0 +1,72 @@
+#---------------------------------------------------------------------------------------#
+# checkpoint.py
+#---------------------------------------------------------------------------------------#
+import time
+from typing import Optional
+from loguru import logger
+from core.config import Config
+from core.hashing import file_hash
+
+CHECKPOINT_PREFIX = "checkpoint:"
+
+#---------------------------------------------------------------------------------------#
+class IndexCheckpoint:
+    """Progress of indexing one input file, stored in the metadata collection.
+
+    After each committed batch the writer records how many chunks of the file's
+    stream are stored and the last chunk id. A checkpoint only applies while the
+    input file and the embedding model are unchanged.
+    """
+
+    def __init__(self, metadata, name: str, source_file: str, model_name: str = Config.MODEL_NAME):
+        self.metadata = metadata
+        self.name = name
+        self.key = f"{CHECKPOINT_PREFIX}{name}"
+        self.source_hash = file_hash(source_file)
+        self.model_name = model_name
+
+    #----------------------------------------------------------------------------------#
+    def load(self) -> Optional[dict]:
+        """The stored checkpoint, or None if there is none or it is for other input"""
+        doc = self.metadata.find_one({"_id": self.key})
+        if doc is None:
+            return None
+        if doc.get("source_hash") != self.source_hash or doc.get("model") != self.model_name:
+            logger.info(f"Ignoring checkpoint for {self.name}: input or model changed")
+            return None
+        return doc
+
+    #----------------------------------------------------------------------------------#
+    def commit(self, position: int, last_chunk_id):
+        """Record that the first `position` chunks of the stream are stored"""
+        self.metadata.update_one(
+            {"_id": self.key},
+            {"$set": {
+                "source_hash": self.source_hash,
+                "model": self.model_name,
+                "position": position,
+                "last_chunk_id": last_chunk_id,
+                "complete": False,
+                "updated": time.time()
+            }},
+            upsert=True
+        )
+
+    #----------------------------------------------------------------------------------#
+    def complete(self):
+        """Mark the whole file as indexed"""
+        self.metadata.update_one(
+            {"_id": self.key},
+            {"$set": {"source_hash": self.source_hash, "model": self.model_name,
+                      "complete": True, "updated": time.time()}},
+            upsert=True
+        )
+
+    #----------------------------------------------------------------------------------#
+    @staticmethod
+    def clear_all(metadata) -> int:
+        """Delete every checkpoint (e.g. after the collection was dropped)"""
+        result = metadata.delete_many({"_id": {"$regex": f"^{CHECKPOINT_PREFIX}"}})
+        return result.deleted_count
+
+#---------------------------------------------------------------------------------------#
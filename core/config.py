@@ -8,23 +8,121 @@ class Config:
     """Configuration settings for the Orthomolecular Medicine RAG system."""
 
     # Database Configuration
-    MONGODB_URI     = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-    DATABASE_NAME   = "books"
-    COLLECTION_NAME = "chunks"
-    BATCH_SIZE      = 4    # Reduce to prevent CUDA memory issues
+    MONGODB_URI         = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+    DATABASE_NAME       = "books"
+    COLLECTION_NAME     = "chunks"
+    METADATA_COLLECTION = "metadata"
+    DEFAULT_DOC_ID      = "The-Gerson-Therapy-Reduced"  # doc_id for chunks without one
+
+    # Embedding storage: "array" (BSON doubles), "float16" or "int8" (BSON Binary)
+    EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "array")
 
     # Model Configuration
     MODEL_NAME       = "sentence-transformers/all-MiniLM-L6-v2"
     VECTOR_DIMENSION = 384
 
+    # Embedding backend: "torch", "onnx" or "onnx-int8" (ONNX Runtime, CPU)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    ONNX_CACHE_DIR    = "data/onnx"  # Exported (and quantized) ONNX models
+    ONNX_QUANTIZATION = "avx2"       # "arm64", "avx2", "avx512" or "avx512_vnni"
+
+    # Embedding worker pool for bulk indexing (CPU); None or 1 = in-process model
+    EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", 0)) or None
+
+    # Embedding batching: texts are sorted by token length and grouped so that
+    # batch rows x longest text stays under a padded-token budget
+    EMBED_BATCH_TOKENS   = int(os.getenv("EMBED_BATCH_TOKENS", 0)) or None  # None = per device
+    DEVICE_BATCH_TOKENS  = {"cuda": 8192, "mps": 8192, "cpu": 16384}
+    EMBED_MAX_BATCH_SIZE = 256
+
     # Search Configuration
-    TOP_K = 3
+    TOP_K       = 3
+    SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")  # "vector" or "hybrid"
+
+    # Hybrid Search Configuration (reciprocal-rank fusion of $text and vector hits)
+    HYBRID_VECTOR_CANDIDATES = 50
+    HYBRID_TEXT_CANDIDATES   = 50
+    HYBRID_VECTOR_WEIGHT     = 1.0
+    HYBRID_TEXT_WEIGHT       = 1.0
+    RRF_K                    = 60
+
+    # Vector Index Configuration
+    VECTOR_INDEX         = os.getenv("VECTOR_INDEX", "exact")  # "exact" or "ivf"
+    IVF_INDEX_PATH       = "data/ivf_index.npz"
+    IVF_NLIST            = None  # Number of lists, None = 4 * sqrt(chunk count)
+    IVF_NPROBE           = 16    # Lists scanned per query (recall vs latency)
+    IVF_TRAIN_ITERATIONS = 10
+    IVF_MIN_TRAIN_SIZE   = 1024  # Below this many chunks the IVF index stays untrained (exact scan)
+    SNAPSHOT_DIR         = "data/snapshot"  # Memory-mapped embedding snapshot
+    INDEX_VERSION_CHECK  = 5.0   # Seconds between checks that a loaded index is still current
+
+    # Query Embedding Cache Configuration
+    QUERY_CACHE_SIZE = 1024
+    QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH")  # SQLite file, unset = memory only
+
+    # Chunk Embedding Cache Configuration (survives collection rebuilds)
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite") or None  # "" = off
+    EMBEDDING_CACHE_SIZE = 500_000  # Entries (~1.6 KB each at 384 dims), least recently used evicted
+
+    # Answer Cache Configuration
+    ANSWER_CACHE_SIZE      = 256
+    ANSWER_CACHE_TTL       = 3600  # Seconds
+    ANSWER_CACHE_THRESHOLD = 0.95  # Cosine similarity for near-duplicate queries
 
     # Generation Configuration
     MAX_LENGTH = 768      # More balanced length
     MIN_LENGTH = 100
+    GENERATION_PROFILE = os.getenv("GENERATION_PROFILE", "quality")
+    STREAM_TOKEN_TIMEOUT = 60  # Seconds to wait for the next streamed token
+    CONTEXT_MAX_TOKENS   = None  # Summarizer input budget, None = the model's input window
+
+    # Query Engine Concurrency (blocking work runs on these thread pools, not the event loop)
+    QUERY_IO_WORKERS       = 8    # MongoDB queries and vector index scans
+    EMBED_CONCURRENCY      = 2    # Query / sentence embeddings computed at once
+    GENERATION_CONCURRENCY = 1    # Answers generated at once (each already uses every core)
+    SEARCH_TIMEOUT         = 30   # Seconds per search request
+    GENERATION_TIMEOUT     = 120  # Seconds per answer, generation is stopped after that
+
+    # Answer Mode Configuration
+    ANSWER_MODE          = os.getenv("ANSWER_MODE", "abstractive")  # "abstractive" or "extractive"
+    EXTRACTIVE_SENTENCES = 5     # Sentences selected per answer
+    EXTRACTIVE_LAMBDA    = 0.7   # MMR weight of query relevance vs. diversity
+    EXTRACTIVE_MIN_CHARS = 20    # Shorter sentence fragments are not candidates
+    # Summarizer model, int8 dynamic quantization (CPU only) and decoding per profile
+    GENERATION_PROFILES = {
+        "quality": {   # Original setting, the reference for quality comparisons
+            "model": "facebook/bart-large-cnn", "quantize": False,
+            "num_beams": 4, "length_penalty": 2.0,
+            "min_length": MIN_LENGTH, "max_length": MAX_LENGTH
+        },
+        "balanced": {
+            "model": "sshleifer/distilbart-cnn-12-6", "quantize": True,
+            "num_beams": 2, "length_penalty": 1.0,
+            "min_length": 56, "max_length": 256, "no_repeat_ngram_size": 3
+        },
+        "fast": {
+            "model": "sshleifer/distilbart-cnn-6-6", "quantize": True,
+            "num_beams": 1,  # Greedy
+            "min_length": 30, "max_length": 142, "no_repeat_ngram_size": 3
+        }
+    }
 
     # Chunk Configuration
-    CHUNK_SIZE    = 1024  # More balanced chunk size
-    CHUNK_OVERLAP = 128   # Reduced proportionally
+    CHUNK_SIZE        = 1024  # More balanced chunk size
+    CHUNK_OVERLAP     = 128   # Reduced proportionally
+    READ_BLOCK_SIZE   = 1 << 20  # Characters read per block by the streaming chunker
+    INDEX_BATCH_SIZE  = 256      # Chunks embedded and stored per batch
+    INDEX_QUEUE_DEPTH = 4        # Embedded batches waiting for the writer thread
+
+    # Token-aware chunking: size chunks in embedding-model word-pieces
+    CHUNK_MODE           = os.getenv("CHUNK_MODE", "chars")  # "chars" or "tokens"
+    CHUNK_TOKENS         = 254  # all-MiniLM-L6-v2 window (256) minus [CLS] and [SEP]
+    CHUNK_TOKEN_OVERLAP  = 32
+    TOKENIZER_BATCH_SIZE = 512  # Sentences per fast-tokenizer call
+
+    # Ingestion Configuration
+    SOURCE_GLOB    = "source/**/*.txt"
+    CHUNKS_DIR     = "data/chunks"
+    CHUNK_FORMAT   = "jsonl.gz"  # Chunk file extension: "jsonl.gz", "jsonl" or "json"
+    INGEST_WORKERS = None  # Chunking processes, None = one per CPU
 
@@ -0,0 +1,92 @@
+#---------------------------------------------------------------------------------------#
+# context.py
+#---------------------------------------------------------------------------------------#
+from typing import List, Sequence
+from loguru import logger
+
+SEPARATOR = "\n\n"
+MAX_GAP = 2  # Source characters (the whitespace between chunks) still counted as adjacent
+
+#---------------------------------------------------------------------------------------#
+def _overlap(left: str, right: str, limit: int) -> int:
+    """Length of the longest suffix of left that is a prefix of right (at most limit)"""
+    for length in range(min(limit, len(left), len(right)), 0, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+#---------------------------------------------------------------------------------------#
+def merge_spans(chunks: Sequence[dict]) -> List[dict]:
+    """Merge retrieved chunks whose source spans overlap or touch into one passage.
+
+    The shared text is kept once. A passage scores as its best chunk. Chunks
+    without spans are passed through unchanged.
+    """
+    passages, by_doc = [], {}
+    for chunk in chunks:
+        if chunk.get("start_char") is None or chunk.get("end_char") is None:
+            passages.append({**chunk, "chunk_ids": [chunk.get("chunk_id")]})
+        else:
+            by_doc.setdefault(chunk.get("doc_id"), []).append(chunk)
+
+    for doc_id, doc_chunks in by_doc.items():
+        doc_chunks.sort(key=lambda c: c["start_char"])
+        current = None
+        for chunk in doc_chunks:
+            # end_char is exclusive; consecutive chunks are split at whitespace
+            if current is not None and chunk["start_char"] <= current["end_char"] + MAX_GAP:
+                # Span overlap is in source characters, an upper bound for the
+                # overlap of the whitespace-normalized content
+                shared = _overlap(current["content"], chunk["content"],
+                                  max(current["end_char"] - chunk["start_char"], 0))
+                if chunk["end_char"] > current["end_char"]:
+                    rest = chunk["content"][shared:]
+                    # Spans that meet exactly were split inside a token: join without a space
+                    if not shared and chunk["start_char"] != current["end_char"]:
+                        rest = " " + rest
+                    current["content"] += rest
+                    current["end_char"] = chunk["end_char"]
+                current["score"] = max(current.get("score", 0.0), chunk.get("score", 0.0))
+                current["chunk_ids"].append(chunk.get("chunk_id"))
+            else:
+                if current is not None:
+                    passages.append(current)
+                current = {**chunk, "chunk_ids": [chunk.get("chunk_id")]}
+        passages.append(current)
+
+    return passages
+
+#---------------------------------------------------------------------------------------#
+def build_context(chunks: Sequence[dict], tokenizer, max_tokens: int) -> str:
+    """Pack merged passages, best score first, into at most max_tokens tokens (as
+    counted by the summarizer's tokenizer, special tokens excluded). The passage
+    that crosses the budget is cut at a token boundary; the rest are dropped."""
+    passages = sorted(merge_spans(chunks), key=lambda p: p.get("score", 0.0), reverse=True)
+    separator_tokens = len(tokenizer(SEPARATOR, add_special_tokens=False)["input_ids"])
+
+    parts, used = [], 0
+    for passage in passages:
+        if parts:
+            if used + separator_tokens >= max_tokens:
+                break
+            used += separator_tokens
+        encoded = tokenizer(passage["content"], add_special_tokens=False, return_offsets_mapping=True)
+        remaining = max_tokens - used
+        if len(encoded["input_ids"]) <= remaining:
+            parts.append(passage["content"])
+            used += len(encoded["input_ids"])
+        else:
+            parts.append(passage["content"][:encoded["offset_mapping"][remaining - 1][1]] if remaining else "")
+            used += remaining
+            break
+
+    context = SEPARATOR.join(part for part in parts if part)
+    # Tokens can merge across the joins; trim until the whole context fits
+    while context and len(tokenizer(context, add_special_tokens=False)["input_ids"]) > max_tokens:
+        context = context[:context.rfind(" ")] if " " in context else ""
+
+    logger.info(f"Context: {len(chunks)} chunks merged into {len(passages)} passages, "
+                f"{len(parts)} packed into {used}/{max_tokens} tokens")
+    return context
+
+#---------------------------------------------------------------------------------------#
@@ -1,10 +1,422 @@
 # core/data_ingestion.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from bisect import bisect_right
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+import base64
+import glob
+import gzip
 import json
+import os
 import re
+import time
 from loguru import logger
+import numpy as np
+from core.config import Config
 from core.database import Database
 
+WORD_PATTERN = re.compile(r'\S+')
+CHUNK_FORMAT_VERSION = 1
+CHUNK_EXTENSIONS = (".jsonl.gz", ".jsonl", ".json")
+CHUNK_MODES = ("chars", "tokens")
+SENTENCE_END = re.compile(r'[.!?]["\')\]]*$')
+
+def _normalized_blocks(file_path: str, block_size: int = Config.READ_BLOCK_SIZE
+                       ) -> Iterator[Tuple[str, List[int], List[int]]]:
+    """Read a text file incrementally and yield whitespace-normalized blocks.
+
+    Normalization matches clean_text (every whitespace run becomes one space, no
+    leading/trailing space). Each block comes with word anchors: the block position
+    and original file offset of every word. Characters inside a word map 1:1 and a
+    separator space maps to the character right after the previous word.
+    """
+    carry, carry_offset = "", 0
+    emitted = False
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(block_size)
+            eof = not block
+            text, base = carry + block, carry_offset
+
+            words = list(WORD_PATTERN.finditer(text))
+            carry, carry_offset = "", base + len(text)
+            if words and not eof and words[-1].end() == len(text):
+                # The last word may continue in the next block
+                last = words.pop()
+                carry, carry_offset = last.group(), base + last.start()
+
+            pieces, positions, offsets, length = [], [], [], 0
+            for word in words:
+                if emitted:
+                    pieces.append(' ')
+                    length += 1
+                emitted = True
+                positions.append(length)
+                offsets.append(base + word.start())
+                pieces.append(word.group())
+                length += len(word.group())
+
+            if pieces:
+                yield ''.join(pieces), positions, offsets
+            if eof:
+                return
+
+def _offset_anchors(positions: Iterable[int], offsets: Iterable[int]) -> List[List[int]]:
+    """Compact map from content positions to source offsets: [position, offset] for
+    the first word and every word after a whitespace run that was not a single
+    character (where the shift between the two changes)"""
+    anchors, shift = [], None
+    for position, offset in zip(positions, offsets):
+        if offset - position != shift:
+            anchors.append([position, offset])
+            shift = offset - position
+    return anchors
+
+def source_offset(chunk: Dict, position: int) -> int:
+    """Source file offset of a position in a chunk's (whitespace-normalized) content.
+
+    Exact for chunks carrying "anchors"; older chunks fall back to start_char plus
+    the position, which drifts wherever whitespace was collapsed.
+    """
+    anchors = chunk.get("anchors")
+    if not anchors:
+        return chunk.get("start_char", 0) + position
+    index = max(bisect_right([anchor[0] for anchor in anchors], position) - 1, 0)
+    anchor_position, anchor_offset = anchors[index]
+    return anchor_offset + position - anchor_position
+
+def iter_chunks(file_path: str, chunk_size: int = Config.CHUNK_SIZE,
+                overlap: int = Config.CHUNK_OVERLAP, doc_id: str = Config.DEFAULT_DOC_ID,
+                block_size: int = Config.READ_BLOCK_SIZE) -> Iterator[Dict]:
+    """Stream sentence-aligned chunks from a text file with bounded memory.
+
+    Follows create_chunks' sentence boundary rules, except that the next chunk
+    starts after the last period of the unstripped segment, so chunks do not
+    begin with a stray '. '. The chunks therefore differ from create_chunks'
+    output. start_char/end_char are character offsets into the original file
+    rather than into the cleaned text.
+    """
+    blocks = _normalized_blocks(file_path, block_size)
+    buffer, positions, offsets = "", [], []
+    eof = False
+    start = 0
+    chunk_id = 0
+
+    def original_offset(position: int) -> int:
+        word = bisect_right(positions, position) - 1
+        return offsets[word] + (position - positions[word])
+
+    while True:
+        # Keep enough normalized text buffered to place this chunk's end
+        while not eof and len(buffer) - start <= chunk_size + overlap:
+            block = next(blocks, None)
+            if block is None:
+                eof = True
+                break
+            text, block_positions, block_offsets = block
+            positions.extend(len(buffer) + p for p in block_positions)
+            offsets.extend(block_offsets)
+            buffer += text
+
+        text_length = len(buffer)
+        if start >= text_length:
+            break
+
+        end = start + chunk_size
+        if end < text_length:
+            window_end = min(end + overlap, text_length)
+            next_period = buffer.rfind('.', end - overlap, window_end)
+            if next_period != -1:
+                end = next_period + 1
+        end = min(end, text_length)
+
+        segment = buffer[start:end]
+        chunk_text = segment.strip()
+        if chunk_text:
+            first = start + len(segment) - len(segment.lstrip())
+            last = first + len(chunk_text) - 1
+            # Words starting inside the chunk (the first may begin before it)
+            words = range(bisect_right(positions, first), bisect_right(positions, last))
+            yield {
+                "doc_id": doc_id,
+                "chunk_id": chunk_id,
+                "content": chunk_text,
+                "start_char": original_offset(first),
+                "end_char": original_offset(last) + 1,
+                "length": len(chunk_text),
+                "anchors": _offset_anchors(
+                    [0] + [positions[w] - first for w in words],
+                    [original_offset(first)] + [offsets[w] for w in words]
+                )
+            }
+            chunk_id += 1
+
+        if end == text_length and eof:
+            break
+
+        # Start from last sentence boundary
+        last_period = buffer.rfind('.', start, end)
+        if last_period != -1 and last_period + 1 > start:
+            start = last_period + 1
+        else:
+            start = max(end - overlap, start + 1)
+
+        # Drop consumed text so the buffer stays bounded
+        if start > block_size:
+            word = bisect_right(positions, start) - 1
+            positions = [p - start for p in positions[word:]]
+            offsets = offsets[word:]
+            buffer = buffer[start:]
+            start = 0
+
+def _iter_sentences(file_path: str, max_words: int,
+                    block_size: int = Config.READ_BLOCK_SIZE) -> Iterator[Tuple[List[str], List[int]]]:
+    """Stream (words, original offsets) per sentence of a text file.
+
+    A sentence ends at a word ending in . ! or ? (optionally followed by closing
+    quotes or brackets); runs longer than max_words are cut so memory stays bounded.
+    """
+    words, offsets = [], []
+    for text, _, block_offsets in _normalized_blocks(file_path, block_size):
+        for word, offset in zip(text.split(), block_offsets):
+            words.append(word)
+            offsets.append(offset)
+            if SENTENCE_END.search(word) or len(words) >= max_words:
+                yield words, offsets
+                words, offsets = [], []
+    if words:
+        yield words, offsets
+
+@lru_cache(maxsize=None)
+def load_tokenizer(model_name: str = Config.MODEL_NAME):
+    """Fast (Rust) tokenizer of the embedding model, loaded once per process"""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+def _token_pieces(sentences: Iterable[Tuple[List[str], List[int]]], tokenizer, max_tokens: int,
+                  batch_size: int = Config.TOKENIZER_BATCH_SIZE
+                  ) -> Iterator[Tuple[List[str], List[int], int]]:
+    """Count word-pieces per sentence in batched tokenizer calls.
+
+    Yields (words, offsets, tokens); sentences over max_tokens are split at word
+    boundaries into pieces that fit. Word-piece counts add up across whitespace,
+    so a chunk's count is the sum of its pieces'.
+    """
+    sentences = iter(sentences)
+    while True:
+        batch = list(islice(sentences, batch_size))
+        if not batch:
+            return
+        encoded = tokenizer([' '.join(words) for words, _ in batch],
+                            add_special_tokens=False)["input_ids"]
+        for (words, offsets), ids in zip(batch, encoded):
+            if len(ids) <= max_tokens:
+                yield words, offsets, len(ids)
+                continue
+
+            word_ids = tokenizer(words, add_special_tokens=False)["input_ids"]
+            start, tokens = 0, 0
+            for end, ids in enumerate(word_ids):
+                if tokens and tokens + len(ids) > max_tokens:
+                    yield words[start:end], offsets[start:end], tokens
+                    start, tokens = end, 0
+                # A single word over the budget becomes its own (truncated) piece
+                tokens += len(ids)
+            yield words[start:], offsets[start:], tokens
+
+def iter_token_chunks(file_path: str, max_tokens: int = Config.CHUNK_TOKENS,
+                      overlap: int = Config.CHUNK_TOKEN_OVERLAP,
+                      doc_id: str = Config.DEFAULT_DOC_ID, tokenizer=None,
+                      block_size: int = Config.READ_BLOCK_SIZE) -> Iterator[Dict]:
+    """Stream chunks sized in embedding-model tokens rather than characters.
+
+    Whole sentences are packed up to max_tokens word-pieces (the model's window
+    minus [CLS]/[SEP]), so no stored text is cut off by the model; consecutive
+    chunks share trailing sentences worth up to `overlap` tokens.
+    """
+    tokenizer = tokenizer or load_tokenizer()
+    pieces = _token_pieces(_iter_sentences(file_path, max_tokens, block_size),
+                           tokenizer, max_tokens)
+    window: deque = deque()
+    tokens = 0
+    chunk_id = 0
+
+    def make_chunk():
+        words = [word for piece_words, _, _ in window for word in piece_words]
+        content = ' '.join(words)
+        last_words, last_offsets, _ = window[-1]
+        positions, position = [], 0
+        for word in words:
+            positions.append(position)
+            position += len(word) + 1
+        return {
+            "doc_id": doc_id,
+            "chunk_id": chunk_id,
+            "content": content,
+            "start_char": window[0][1][0],
+            "end_char": last_offsets[-1] + len(last_words[-1]),
+            "length": len(content),
+            "tokens": tokens,
+            "anchors": _offset_anchors(
+                positions, [offset for _, piece_offsets, _ in window for offset in piece_offsets]
+            )
+        }
+
+    for piece in pieces:
+        if window and tokens + piece[2] > max_tokens:
+            yield make_chunk()
+            chunk_id += 1
+            # Carry trailing sentences into the next chunk as overlap
+            carried, carried_tokens = deque(), 0
+            while (window and carried_tokens + window[-1][2] <= overlap
+                   and carried_tokens + window[-1][2] + piece[2] <= max_tokens):
+                carried_tokens += window[-1][2]
+                carried.appendleft(window.pop())
+            window, tokens = carried, carried_tokens
+        window.append(piece)
+        tokens += piece[2]
+
+    if window:
+        yield make_chunk()
+
+def chunk_metadata(chunk_size: int = Config.CHUNK_SIZE,
+                   overlap: int = Config.CHUNK_OVERLAP, **extra) -> Dict:
+    """Metadata describing how a chunk file was produced"""
+    return {"format_version": CHUNK_FORMAT_VERSION, "chunk_size": chunk_size,
+            "overlap": overlap, **extra}
+
+def _open_chunk_file(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def encode_chunk_embedding(embedding) -> str:
+    """Fixed-width column value: base64 of little-endian float32"""
+    return base64.b64encode(np.asarray(embedding, dtype='<f4').tobytes()).decode('ascii')
+
+def decode_chunk_embedding(value: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(value), dtype='<f4')
+
+def write_chunks(chunks: Iterable[Dict], output_file: str,
+                 metadata: Optional[Dict] = None) -> int:
+    """Write chunks one at a time and return how many were written.
+
+    .jsonl / .jsonl.gz files hold a metadata line followed by one compact JSON
+    chunk per line; chunks may carry a precomputed "embedding" (any float
+    sequence), stored base64 float32. .json keeps the original indented layout,
+    with embeddings as float lists.
+    """
+    metadata = metadata or chunk_metadata()
+    if output_file.endswith(".json"):
+        return _write_json_chunks(chunks, output_file, metadata)
+
+    total_chunks = 0
+    with _open_chunk_file(output_file, 'w') as f:
+        f.write(json.dumps({"metadata": metadata}, ensure_ascii=False) + '\n')
+        for chunk in chunks:
+            if chunk.get("embedding") is not None:
+                chunk = {**chunk, "embedding": encode_chunk_embedding(chunk["embedding"])}
+            f.write(json.dumps(chunk, ensure_ascii=False, separators=(',', ':')) + '\n')
+            total_chunks += 1
+    return total_chunks
+
+def _write_json_chunks(chunks: Iterable[Dict], output_file: str, metadata: Dict) -> int:
+    """Legacy single-document JSON layout"""
+    total_chunks = 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write('{\n  "document_chunks": [')
+        for chunk in chunks:
+            if chunk.get("embedding") is not None:
+                # Plain float list: numpy arrays are not JSON serializable
+                chunk = {**chunk, "embedding": np.asarray(chunk["embedding"], dtype=np.float32).tolist()}
+            chunk_json = json.dumps(chunk, indent=2, ensure_ascii=False)
+            f.write(',' if total_chunks else '')
+            f.write('\n    ' + chunk_json.replace('\n', '\n    '))
+            total_chunks += 1
+
+        metadata = {"total_chunks": total_chunks, **metadata}
+        metadata_json = json.dumps(metadata, indent=2, ensure_ascii=False)
+        f.write('\n  ],\n  "metadata": ' + metadata_json.replace('\n', '\n  ') + '\n}')
+    return total_chunks
+
+def read_chunk_metadata(path: str) -> Dict:
+    """Metadata of a chunk file (only the first line of a JSONL file is read)"""
+    if path.endswith(".json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("metadata", {})
+    with _open_chunk_file(path, 'r') as f:
+        return json.loads(f.readline()).get("metadata", {})
+
+def iter_chunk_file(path: str) -> Iterator[Dict]:
+    """Stream the chunks of a chunk file; JSONL is parsed line by line"""
+    if path.endswith(".json"):
+        # The indented layout can only be parsed as a whole
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)["document_chunks"]
+        return
+
+    with _open_chunk_file(path, 'r') as f:
+        for line in f:
+            record = json.loads(line)
+            if "metadata" in record:
+                continue
+            if record.get("embedding") is not None:
+                record["embedding"] = decode_chunk_embedding(record["embedding"])
+            yield record
+
+def iter_chunk_batches(path: str, batch_size: int = Config.INDEX_BATCH_SIZE) -> Iterator[List[Dict]]:
+    """Stream a chunk file as lists of at most batch_size chunks"""
+    chunks = iter_chunk_file(path)
+    while True:
+        batch = list(islice(chunks, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def discover_sources(pattern: str = Config.SOURCE_GLOB) -> List[str]:
+    """All text files matching a (recursive) glob pattern, in a stable order"""
+    return sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+def source_doc_id(file_path: str, root: str) -> str:
+    """Deterministic doc_id for a source file: its path below root without suffix"""
+    relative = os.path.relpath(file_path, root)
+    return os.path.splitext(relative)[0].replace(os.sep, "/")
+
+def stream_chunks(file_path: str, doc_id: str = Config.DEFAULT_DOC_ID,
+                  mode: str = Config.CHUNK_MODE) -> Tuple[Iterator[Dict], Dict]:
+    """Chunk iterator for a source file in the given mode, with its file metadata"""
+    if mode == "tokens":
+        chunks = iter_token_chunks(file_path, Config.CHUNK_TOKENS, Config.CHUNK_TOKEN_OVERLAP, doc_id)
+        metadata = chunk_metadata(Config.CHUNK_TOKENS, Config.CHUNK_TOKEN_OVERLAP,
+                                  mode=mode, tokenizer=Config.MODEL_NAME)
+    elif mode == "chars":
+        chunks = iter_chunks(file_path, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP, doc_id)
+        metadata = chunk_metadata(Config.CHUNK_SIZE, Config.CHUNK_OVERLAP, mode=mode)
+    else:
+        raise ValueError(f"Unknown chunk mode '{mode}', expected one of {CHUNK_MODES}")
+    return chunks, metadata
+
+def chunk_file(file_path: str, output_file: str, doc_id: str,
+               mode: str = Config.CHUNK_MODE) -> Dict:
+    """Chunk one source file to its own output file (runs in a worker process).
+
+    Chunk ids restart at 0 for every document, so they do not depend on which
+    worker handles the file or in what order files finish.
+    """
+    start_time = time.perf_counter()
+    chunks, metadata = stream_chunks(file_path, doc_id, mode)
+    metadata.update(doc_id=doc_id, source=os.path.basename(file_path))
+    total_chunks = write_chunks(chunks, output_file, metadata)
+    return {
+        "doc_id": doc_id,
+        "source": file_path,
+        "output": output_file,
+        "chunks": total_chunks,
+        "bytes": os.path.getsize(file_path),
+        "seconds": time.perf_counter() - start_time
+    }
+
 class DataIngestionPipeline:
     def __init__(self):
         self.db = Database()
@@ -27,8 +439,9 @@ class DataIngestionPipeline:
         text = ' '.join(text.split())
         return text
     
-    def create_chunks(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict]:
-        """Split text into overlapping chunks"""
+    def create_chunks(self, text: str, chunk_size: int = 1000, overlap: int = 200,
+                      doc_id: str = Config.DEFAULT_DOC_ID) -> List[Dict]:
+        """Split text into overlapping chunks of the given document"""
         logger.info("Creating text chunks")
         chunks = []
         text = self.clean_text(text)
@@ -51,6 +464,7 @@ class DataIngestionPipeline:
             
             # Create chunk object
             chunk_obj = {
+                "doc_id": doc_id,
                 "chunk_id": len(chunks),
                 "content": chunk_text,
                 "start_char": start,
@@ -73,27 +487,35 @@ class DataIngestionPipeline:
         logger.info(f"Created {len(chunks)} chunks")
         return chunks
     
-    def save_chunks(self, chunks: List[Dict], output_file: str):
-        """Save chunks to JSON file"""
+    def iter_chunks(self, file_path: str, chunk_size: int = Config.CHUNK_SIZE,
+                    overlap: int = Config.CHUNK_OVERLAP,
+                    doc_id: str = Config.DEFAULT_DOC_ID,
+                    mode: str = Config.CHUNK_MODE) -> Iterator[Dict]:
+        """Stream chunks from a text file with bounded memory. In "tokens" mode
+        chunk_size/overlap are word-pieces of the embedding model's tokenizer"""
+        logger.info(f"Streaming {mode} chunks from {file_path}")
+        if mode == "tokens":
+            return iter_token_chunks(file_path, chunk_size, overlap, doc_id)
+        return iter_chunks(file_path, chunk_size, overlap, doc_id)
+    
+    def save_chunks(self, chunks: Iterable[Dict], output_file: str,
+                    metadata: Optional[Dict] = None) -> int:
+        """Save chunks to a JSONL (.jsonl/.jsonl.gz) or JSON file, one at a time"""
         logger.info(f"Saving chunks to {output_file}")
         try:
-            output_data = {
-                "document_chunks": chunks,
-                "metadata": {
-                    "total_chunks": len(chunks),
-                    "chunk_size": 1000,
-                    "overlap": 200
-                }
-            }
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, indent=2, ensure_ascii=False)
-                
+            total_chunks = write_chunks(chunks, output_file, metadata)
             logger.info("Chunks saved successfully")
+            return total_chunks
         except Exception as e:
             logger.error(f"Error saving chunks: {e}")
             raise
     
+    def iter_chunk_batches(self, file_path: str,
+                           batch_size: int = Config.INDEX_BATCH_SIZE) -> Iterator[List[Dict]]:
+        """Stream batches of chunks from a chunk file without loading it whole"""
+        logger.info(f"Streaming chunks from {file_path}")
+        return iter_chunk_batches(file_path, batch_size)
+    
     def load_data(self, file_path: str) -> Dict:
         """Load data from JSON file"""
         logger.info(f"Loading data from {file_path}")
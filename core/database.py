@@ -1,24 +1,39 @@
 #---------------------------------------------------------------------------------------#
 # database.py
 #---------------------------------------------------------------------------------------#
-from pymongo import MongoClient, ReplaceOne
+import os
+import threading
+import time
+from pymongo import MongoClient, ReplaceOne, UpdateOne, ReturnDocument
+from pymongo.errors import OperationFailure
 from loguru import logger
-import numpy as np
 from core.config import Config
+from core.vector_index import VectorIndex
+from core.ann_index import IVFIndex
+from core.embedding_codec import encode_embedding, decode_embedding, storage_format
+from core.hashing import content_hash
+from core.snapshot import EmbeddingSnapshot
 
 #---------------------------------------------------------------------------------------#
 class Database:
     def __init__(self):
-        """Initialize MongoDB client for large text database"""
+        """Initialize MongoDB client for large text database.
+
+        Connecting does not write: creating indices and upgrading older collections
+        is the indexer's job (ensure_indexes), so read-only users can start together.
+        """
         try:
             self.client     = MongoClient(Config.MONGODB_URI)
             self.db         = self.client[Config.DATABASE_NAME]
             self.collection = self.db[Config.COLLECTION_NAME]
+            self.metadata   = self.db[Config.METADATA_COLLECTION]
             self.client.server_info()
-            
-            # Create indices
-            self.collection.create_index([("chunk_id", 1)], unique=True)
-            self.collection.create_index([("content", "text")])
+            self._vector_index = None
+            self._unsaved_version = None  # Version of IVF updates not yet written to disk
+            self._index_version = None    # Embeddings version the loaded index reflects
+            self._pending_version = None  # Newer version seen without a persisted index
+            self._next_version_check = 0.0
+            self._index_lock = threading.RLock()
             
             logger.info(f"Connected to MongoDB - Database: {self.db.name}")
             count = self.collection.count_documents({})
@@ -29,50 +44,256 @@ class Database:
             raise
 
     #----------------------------------------------------------------------------------#
-    def get_similar_chunks(self, query_embedding, top_k=Config.TOP_K):
-        """Find similar chunks using vector similarity search"""
+    def ensure_indexes(self):
+        """Create the (doc_id, chunk_id) and text indices, upgrading single-book
+        collections. Idempotent, and safe when two indexers upgrade at once"""
+        if "chunk_id_1" in self.collection.index_information():
+            # Chunks stored before documents existed belong to the default document
+            result = self.collection.update_many(
+                {"doc_id": {"$exists": False}},
+                {"$set": {"doc_id": Config.DEFAULT_DOC_ID}}
+            )
+            try:
+                self.collection.drop_index("chunk_id_1")
+            except OperationFailure:
+                pass  # Already dropped by a concurrent upgrade
+            logger.info(f"Upgraded chunk_id index to (doc_id, chunk_id); "
+                        f"{result.modified_count} chunks assigned to '{Config.DEFAULT_DOC_ID}'")
+
+        self.collection.create_index([("doc_id", 1), ("chunk_id", 1)], unique=True)
+        self.collection.create_index([("content", "text")])
+        self.collection.create_index([("content_hash", 1), ("model", 1)])
+        self._backfill_content_hashes()
+
+    #----------------------------------------------------------------------------------#
+    def _backfill_content_hashes(self, batch_size=1000):
+        """Hash chunks stored before content hashes existed so re-indexing can skip them"""
+        operations = []
+        updated = 0
+        cursor = self.collection.find({"content_hash": {"$exists": False}}, {"content": 1})
+        for doc in cursor:
+            # Older chunks were always embedded with the configured model
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"content_hash": content_hash(doc.get("content", "")),
+                          "model": Config.MODEL_NAME}}
+            ))
+            if len(operations) >= batch_size:
+                self.collection.bulk_write(operations, ordered=False)
+                updated += len(operations)
+                operations = []
+
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+            updated += len(operations)
+        if updated:
+            logger.info(f"Backfilled content hashes for {updated} chunks")
+
+    #----------------------------------------------------------------------------------#
+    def list_documents(self):
+        """Return {doc_id: chunk count} for every indexed document"""
+        pipeline = [{"$group": {"_id": "$doc_id", "chunks": {"$sum": 1}}}, {"$sort": {"_id": 1}}]
+        return {doc["_id"]: doc["chunks"] for doc in self.collection.aggregate(pipeline)}
+
+    #----------------------------------------------------------------------------------#
+    def delete_documents(self, doc_ids, save_index=True):
+        """Delete every chunk of the given documents (see delete_chunks)"""
+        cursor = self.collection.find({"doc_id": {"$in": list(doc_ids)}},
+                                      {"_id": 0, "doc_id": 1, "chunk_id": 1})
+        return self.delete_chunks([(doc["doc_id"], doc["chunk_id"]) for doc in cursor], save_index)
+
+    #----------------------------------------------------------------------------------#
+    def embeddings_version(self) -> int:
+        """Version stamp of the stored embeddings, bumped on every write"""
+        doc = self.metadata.find_one({"_id": "embeddings"})
+        return doc.get("version", 0) if doc else 0
+
+    #----------------------------------------------------------------------------------#
+    def _bump_embeddings_version(self) -> int:
+        """Record that the stored embeddings changed and return the new version"""
+        doc = self.metadata.find_one_and_update(
+            {"_id": "embeddings"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["version"]
+
+    #----------------------------------------------------------------------------------#
+    @property
+    def vector_index(self):
+        """In-process vector index (exact or IVF per Config.VECTOR_INDEX), loaded on first use"""
+        with self._index_lock:
+            if self._vector_index is None:
+                version = self.embeddings_version()
+                if Config.VECTOR_INDEX == "ivf":
+                    self._vector_index = self._load_ivf_index(version)
+                else:
+                    self._vector_index = self._load_exact_index(version)
+                self._index_version = version
+                self._next_version_check = time.monotonic() + Config.INDEX_VERSION_CHECK
+            return self._vector_index
+
+    #----------------------------------------------------------------------------------#
+    def _current_vector_index(self):
+        """The vector index for a search, reloaded when another process changed the
+        stored embeddings.
+
+        The version stamp is read at most every INDEX_VERSION_CHECK seconds. A newer
+        version is picked up from its snapshot (or IVF file), which the indexer
+        writes when a run ends. While a run is still writing there is none yet, so
+        the loaded index keeps serving; once the version has stopped moving for a
+        whole interval, the index is rebuilt from the collection instead.
+        """
+        with self._index_lock:
+            if self._vector_index is None or time.monotonic() < self._next_version_check:
+                return self.vector_index
+            self._next_version_check = time.monotonic() + Config.INDEX_VERSION_CHECK
+
+            version = self.embeddings_version()
+            if version == self._index_version:
+                return self._vector_index
+
+            index = self._persisted_index(version)
+            if index is not None or version == self._pending_version:
+                logger.info(f"Stored embeddings changed (v{self._index_version} -> v{version}), "
+                            f"reloading the vector index")
+                self._vector_index = index
+                self._pending_version = None
+                if index is None:
+                    return self.vector_index
+                self._index_version = version
+            else:
+                self._pending_version = version
+            return self._vector_index
+
+    #----------------------------------------------------------------------------------#
+    def _persisted_index(self, version):
+        """The persisted index at exactly this embeddings version, else None"""
+        if Config.VECTOR_INDEX == "ivf":
+            if IVFIndex.saved_version(Config.IVF_INDEX_PATH) != version:
+                return None
+            return IVFIndex.load(Config.IVF_INDEX_PATH)
+        count = self.collection.count_documents({"embedding": {"$exists": True}})
+        return EmbeddingSnapshot().load(version, count)
+
+    #----------------------------------------------------------------------------------#
+    def _load_exact_index(self, version) -> VectorIndex:
+        """Memory-map the embedding snapshot, rebuilding it if it is stale"""
+        count = self.collection.count_documents({"embedding": {"$exists": True}})
+
+        index = EmbeddingSnapshot().load(version, count)
+        if index is None:
+            index = self.refresh_snapshot(version)
+        return index
+
+    #----------------------------------------------------------------------------------#
+    def refresh_snapshot(self, version=None) -> VectorIndex:
+        """Load all embeddings from the collection and write a fresh snapshot"""
+        if version is None:
+            version = self.embeddings_version()
+        index = VectorIndex.from_collection(self.collection)
+        EmbeddingSnapshot().write(index, version)
+        return index
+
+    #----------------------------------------------------------------------------------#
+    def _load_ivf_index(self, version) -> IVFIndex:
+        """Load the persisted IVF index, retraining and saving it when stale"""
+        if os.path.exists(Config.IVF_INDEX_PATH):
+            index = IVFIndex.load(Config.IVF_INDEX_PATH)
+            if index.version == version:
+                return index
+            logger.info(f"IVF index is stale (v{index.version} != v{version}), retraining")
+
+        index = IVFIndex.from_vector_index(self._load_exact_index(version))
+        index.save(Config.IVF_INDEX_PATH, version)
+        return index
+
+    #----------------------------------------------------------------------------------#
+    def write_snapshot(self):
+        """Snapshot the loaded exact index (kept current by store/delete), else rebuild"""
+        if isinstance(self._vector_index, VectorIndex):
+            EmbeddingSnapshot().write(self._vector_index, self.embeddings_version())
+            return self._vector_index
+        return self.refresh_snapshot()
+
+    #----------------------------------------------------------------------------------#
+    def reset_vector_index(self):
+        """Forget the in-memory index and delete the persisted IVF index"""
+        self._vector_index = None
+        self._unsaved_version = None
+        self._index_version = None
+        if os.path.exists(Config.IVF_INDEX_PATH):
+            os.remove(Config.IVF_INDEX_PATH)
+            logger.info(f"Removed IVF index: {Config.IVF_INDEX_PATH}")
+
+    #----------------------------------------------------------------------------------#
+    def vector_search(self, query_embedding, top_k=Config.TOP_K, documents=None):
+        """Return ((doc_id, chunk_id), score) pairs for the chunks closest to the query"""
+        return self._current_vector_index().search(query_embedding, top_k, documents=documents)
+
+    #----------------------------------------------------------------------------------#
+    def text_search(self, query, limit=Config.HYBRID_TEXT_CANDIDATES, documents=None):
+        """Return ((doc_id, chunk_id), textScore) pairs from the MongoDB $text index"""
         try:
-            query_embedding = (query_embedding.tolist() 
-                             if isinstance(query_embedding, np.ndarray) 
-                             else query_embedding)
-
-            pipeline = [
-                {
-                    "$set": {
-                        "similarity": {
-                            "$reduce": {
-                                "input": {"$range": [0, {"$size": "$embedding"}]},
-                                "initialValue": 0,
-                                "in": {
-                                    "$add": [
-                                        "$$value",
-                                        {
-                                            "$multiply": [
-                                                {"$arrayElemAt": ["$embedding", "$$this"]},
-                                                {"$arrayElemAt": [query_embedding, "$$this"]}
-                                            ]
-                                        }
-                                    ]
-                                }
-                            }
-                        }
-                    }
-                },
-                {"$sort": {"similarity": -1}},
-                {"$limit": top_k},
-                {
-                    "$project": {
-                        "_id": 0,
-                        "chunk_id": 1,
-                        "content": 1,
-                        "start_char": 1,
-                        "end_char": 1,
-                        "score": "$similarity"
-                    }
-                }
-            ]
+            text_filter = {"$text": {"$search": query}}
+            if documents is not None:
+                text_filter["doc_id"] = {"$in": list(documents)}
+
+            cursor = self.collection.find(
+                text_filter,
+                {"_id": 0, "doc_id": 1, "chunk_id": 1, "score": {"$meta": "textScore"}}
+            ).sort([("score", {"$meta": "textScore"})]).limit(limit)
+            return [((doc["doc_id"], doc["chunk_id"]), doc["score"]) for doc in cursor]
 
-            results = list(self.collection.aggregate(pipeline))
+        except Exception as e:
+            logger.error(f"Error running text search: {e}")
+            return []
+
+    #----------------------------------------------------------------------------------#
+    def _key_filter(self, keys):
+        """Query matching a set of (doc_id, chunk_id) keys, one clause per document"""
+        by_doc = {}
+        for doc_id, chunk_id in keys:
+            by_doc.setdefault(doc_id, []).append(chunk_id)
+        return {"$or": [
+            {"doc_id": doc_id, "chunk_id": {"$in": chunk_ids}}
+            for doc_id, chunk_ids in by_doc.items()
+        ]} if by_doc else None
+
+    #----------------------------------------------------------------------------------#
+    def _fetch_documents(self, keys):
+        """Fetch display fields for (doc_id, chunk_id) keys in one round trip"""
+        query = self._key_filter(keys)
+        if query is None:
+            return {}
+
+        cursor = self.collection.find(
+            query,
+            {"_id": 0, "doc_id": 1, "chunk_id": 1, "content": 1, "start_char": 1, "end_char": 1,
+             "anchors": 1}
+        )
+        return {(doc["doc_id"], doc["chunk_id"]): doc for doc in cursor}
+
+    #----------------------------------------------------------------------------------#
+    def fetch_chunks(self, hits):
+        """Fetch content for ((doc_id, chunk_id), score) hits, preserving their order"""
+        if not hits:
+            return []
+
+        docs = self._fetch_documents(key for key, _ in hits)
+        return [
+            {**docs[key], "score": score}
+            for key, score in hits
+            if key in docs
+        ]
+
+    #----------------------------------------------------------------------------------#
+    def get_similar_chunks(self, query_embedding, top_k=Config.TOP_K, documents=None):
+        """Find similar chunks using vector similarity search, optionally within documents"""
+        try:
+            hits = self.vector_search(query_embedding, top_k, documents=documents)
+            results = self.fetch_chunks(hits)
             logger.info(f"Found {len(results)} similar chunks")
             return results
 
@@ -81,40 +302,146 @@ class Database:
             return []
 
     #----------------------------------------------------------------------------------#
-    def store_chunks(self, chunks, embeddings):
-        """Store text chunks with their embeddings"""
-        if not chunks or not embeddings:
+    def get_similar_chunks_many(self, query_embeddings, top_k=Config.TOP_K, documents=None):
+        """Vector search for a batch of queries, fetching all content in one query"""
+        try:
+            hits_per_query = self._current_vector_index().search_many(
+                query_embeddings, top_k, documents=documents
+            )
+            docs = self._fetch_documents({
+                key for hits in hits_per_query for key, _ in hits
+            })
+
+            results = [
+                [{**docs[key], "score": score} for key, score in hits if key in docs]
+                for hits in hits_per_query
+            ]
+            logger.info(f"Found similar chunks for {len(results)} queries")
+            return results
+
+        except Exception as e:
+            logger.error(f"Error finding similar chunks: {e}")
+            return [[] for _ in range(len(query_embeddings))]
+
+    #----------------------------------------------------------------------------------#
+    def chunk_states(self, keys):
+        """Return {(doc_id, chunk_id): doc} with the hash, model and offsets of stored chunks"""
+        query = self._key_filter(keys)
+        if query is None:
+            return {}
+        cursor = self.collection.find(
+            query,
+            {"_id": 0, "doc_id": 1, "chunk_id": 1, "content_hash": 1, "model": 1,
+             "start_char": 1, "end_char": 1, "length": 1, "anchors": 1}
+        )
+        return {(doc["doc_id"], doc["chunk_id"]): doc for doc in cursor}
+
+    #----------------------------------------------------------------------------------#
+    def embeddings_by_hash(self, hashes, model=Config.MODEL_NAME):
+        """Return {content_hash: embedding} for stored chunks embedded by this model"""
+        hashes = list(set(hashes))
+        if not hashes:
+            return {}
+        cursor = self.collection.find(
+            {"content_hash": {"$in": hashes}, "model": model, "embedding": {"$exists": True}},
+            {"_id": 0, "content_hash": 1, "embedding": 1}
+        )
+        return {doc["content_hash"]: decode_embedding(doc["embedding"]) for doc in cursor}
+
+    #----------------------------------------------------------------------------------#
+    def update_offsets(self, chunks):
+        """Update the positions of chunks whose content (and embedding) is unchanged"""
+        operations = [
+            UpdateOne(
+                {"doc_id": chunk.get("doc_id", Config.DEFAULT_DOC_ID), "chunk_id": chunk["chunk_id"]},
+                {"$set": {"start_char": chunk["start_char"], "end_char": chunk["end_char"],
+                          "length": chunk["length"], "anchors": chunk.get("anchors")}}
+            )
+            for chunk in chunks
+        ]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    #----------------------------------------------------------------------------------#
+    def orphaned_chunks(self, seen):
+        """Keys of stored chunks of the given documents that were not seen in a re-index.
+
+        `seen` maps doc_id to the set of chunk ids just indexed for that document.
+        """
+        orphans = []
+        for doc_id, chunk_ids in seen.items():
+            cursor = self.collection.find(
+                {"doc_id": doc_id, "chunk_id": {"$nin": list(chunk_ids)}},
+                {"_id": 0, "chunk_id": 1}
+            )
+            orphans.extend((doc_id, doc["chunk_id"]) for doc in cursor)
+        return orphans
+
+    #----------------------------------------------------------------------------------#
+    def delete_chunks(self, keys, save_index=True):
+        """Delete chunks by key and drop them from the loaded and persisted indices
+        (save_index=False leaves persisting the IVF index to save_vector_index)"""
+        keys = list(keys)
+        query = self._key_filter(keys)
+        if query is None:
+            return 0
+
+        index = self._index_to_update()
+        result = self.collection.delete_many(query)
+        version = self._bump_embeddings_version()
+        if index is not None:
+            index.remove(keys)
+            self._index_changed(index, version, save_index)
+        logger.info(f"Chunks deleted: {result.deleted_count}")
+        return result.deleted_count
+
+    #----------------------------------------------------------------------------------#
+    def store_chunks(self, chunks, embeddings, ordered=True, save_index=True):
+        """Store text chunks with their embeddings (ordered=False lets the server
+        apply the writes in any order and continue past individual errors).
+        Bulk writers pass save_index=False and call save_vector_index once at the end."""
+        if not len(chunks) or not len(embeddings):
             logger.error("No chunks or embeddings to store")
             return
 
         operations = []
+        stored_keys, stored_embeddings = [], []
         for chunk, embedding in zip(chunks, embeddings):
             if not all(key in chunk for key in ["chunk_id", "content"]):
                 logger.warning(f"Skipping chunk missing required fields: {chunk}")
                 continue
 
-            embedding = (embedding.tolist() 
-                        if isinstance(embedding, np.ndarray) 
-                        else embedding)
-
+            doc_id = chunk.get("doc_id", Config.DEFAULT_DOC_ID)
+            document = {
+                "doc_id": doc_id,
+                "chunk_id": chunk["chunk_id"],
+                "content": chunk["content"],
+                "start_char": chunk["start_char"],
+                "end_char": chunk["end_char"],
+                "length": chunk["length"],
+                "content_hash": chunk.get("content_hash") or content_hash(chunk["content"]),
+                "model": Config.MODEL_NAME,
+                "embedding": encode_embedding(embedding)
+            }
+            if chunk.get("anchors"):
+                # Content position -> source offset map (see data_ingestion.source_offset)
+                document["anchors"] = chunk["anchors"]
             operations.append(
-                ReplaceOne(
-                    {"chunk_id": chunk["chunk_id"]},
-                    {
-                        "chunk_id": chunk["chunk_id"],
-                        "content": chunk["content"],
-                        "start_char": chunk["start_char"],
-                        "end_char": chunk["end_char"],
-                        "length": chunk["length"],
-                        "embedding": embedding
-                    },
-                    upsert=True
-                )
+                ReplaceOne({"doc_id": doc_id, "chunk_id": chunk["chunk_id"]}, document, upsert=True)
             )
+            stored_keys.append((doc_id, chunk["chunk_id"]))
+            stored_embeddings.append(embedding)
 
         if operations:
             try:
-                result = self.collection.bulk_write(operations)
+                index = self._index_to_update()
+                result = self.collection.bulk_write(operations, ordered=ordered)
+                version = self._bump_embeddings_version()
+                if index is not None:
+                    # Incremental insert: new keys go to their nearest list, no retraining
+                    index.upsert(stored_keys, stored_embeddings)
+                    self._index_changed(index, version, save_index)
                 logger.info(f"Chunks stored: {len(operations)}")
                 logger.info(f"Inserted: {result.upserted_count}")
                 logger.info(f"Modified: {result.modified_count}")
@@ -123,6 +450,61 @@ class Database:
                 logger.error(f"Error storing chunks: {e}")
                 raise
 
+    #----------------------------------------------------------------------------------#
+    def migrate_embeddings(self, storage=Config.EMBEDDING_STORAGE, batch_size=1000):
+        """Re-encode every stored embedding into the given storage format"""
+        converted = skipped = 0
+        operations = []
+        cursor = self.collection.find({}, {"embedding": 1})
+
+        for doc in cursor:
+            if "embedding" not in doc or storage_format(doc["embedding"]) == storage:
+                skipped += 1
+                continue
+
+            embedding = encode_embedding(decode_embedding(doc["embedding"]), storage)
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"embedding": embedding}}))
+
+            if len(operations) >= batch_size:
+                self.collection.bulk_write(operations, ordered=False)
+                converted += len(operations)
+                operations = []
+
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+            converted += len(operations)
+
+        if converted:
+            self._bump_embeddings_version()
+        logger.info(f"Embeddings migrated to '{storage}': {converted} converted, {skipped} unchanged")
+        return converted
+
+    #----------------------------------------------------------------------------------#
+    def _index_to_update(self):
+        """The index a write must keep current: the loaded one, or the persisted IVF
+        index loaded now. Called before the write, while the stored version still
+        matches the index on disk, so loading it does not count it as stale."""
+        if (self._vector_index is None and Config.VECTOR_INDEX == "ivf"
+                and os.path.exists(Config.IVF_INDEX_PATH)):
+            return self.vector_index
+        return self._vector_index
+
+    #----------------------------------------------------------------------------------#
+    def _index_changed(self, index, version, save):
+        """Note that the index now reflects `version`, persisting it now if save"""
+        self._index_version = version
+        if isinstance(index, IVFIndex):
+            self._unsaved_version = version
+            if save:
+                self.save_vector_index()
+
+    #----------------------------------------------------------------------------------#
+    def save_vector_index(self):
+        """Write the loaded IVF index to disk if it has updates not yet saved"""
+        if self._unsaved_version is not None and isinstance(self._vector_index, IVFIndex):
+            self._vector_index.save(Config.IVF_INDEX_PATH, self._unsaved_version)
+        self._unsaved_version = None
+
     #----------------------------------------------------------------------------------#
     def close(self):
         """Close database connection"""
@@ -0,0 +1,180 @@
+#---------------------------------------------------------------------------------------#
+# embedding_backend.py
+#---------------------------------------------------------------------------------------#
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+from loguru import logger
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from core.config import Config
+from core.tokenizer_lock import tokenizer_lock
+
+#---------------------------------------------------------------------------------------#
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+#---------------------------------------------------------------------------------------#
+def _onnx_dir(model_name: str) -> str:
+    """Cache directory of the exported ONNX model"""
+    return os.path.join(Config.ONNX_CACHE_DIR, model_name.replace("/", "__"))
+
+#---------------------------------------------------------------------------------------#
+def _quantized_file() -> str:
+    return f"onnx/model_qint8_{Config.ONNX_QUANTIZATION}.onnx"
+
+#---------------------------------------------------------------------------------------#
+def export_onnx(model_name: str = Config.MODEL_NAME, quantize: bool = False) -> str:
+    """Export the model to ONNX (and optionally a dynamic int8 copy) once, returning
+    the cache directory; later calls reuse the cached files"""
+    path = _onnx_dir(model_name)
+    if not os.path.exists(os.path.join(path, "onnx", "model.onnx")):
+        logger.info(f"Exporting {model_name} to ONNX in {path}")
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(path)
+
+    if quantize and not os.path.exists(os.path.join(path, _quantized_file())):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        logger.info(f"Quantizing ONNX model to int8 ({Config.ONNX_QUANTIZATION})")
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(path, backend="onnx"),
+            quantization_config=Config.ONNX_QUANTIZATION,
+            model_name_or_path=path
+        )
+    return path
+
+#---------------------------------------------------------------------------------------#
+def load_embedder(backend: str = Config.EMBEDDING_BACKEND,
+                  model_name: str = Config.MODEL_NAME,
+                  device: Optional[str] = None) -> SentenceTransformer:
+    """Load the sentence embedding model on the given backend (and device, default
+    auto-detected). Its tokenizer calls are serialized, so threads may share it"""
+    if backend == "torch":
+        model = SentenceTransformer(model_name, device=device)
+    elif backend == "onnx":
+        model = SentenceTransformer(export_onnx(model_name), device=device, backend="onnx")
+    elif backend == "onnx-int8":
+        model = SentenceTransformer(
+            export_onnx(model_name, quantize=True),
+            device=device,
+            backend="onnx",
+            model_kwargs={"file_name": _quantized_file()}
+        )
+    else:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+    return _lock_tokenizer(model)
+
+#---------------------------------------------------------------------------------------#
+def _lock_tokenizer(model: SentenceTransformer) -> SentenceTransformer:
+    """Hold the tokenizer lock while encode() tokenizes a batch, but not during the
+    forward pass, so concurrent encodes still overlap their inference"""
+    lock = tokenizer_lock(model.tokenizer)
+    tokenize = model.tokenize
+
+    def locked_tokenize(texts, *args, **kwargs):
+        with lock:
+            return tokenize(texts, *args, **kwargs)
+
+    model.tokenize = locked_tokenize
+    return model
+
+#---------------------------------------------------------------------------------------#
+def device_batch_tokens(device: str) -> int:
+    """Padded-token budget per embedding batch for a device type"""
+    return Config.EMBED_BATCH_TOKENS or Config.DEVICE_BATCH_TOKENS.get(
+        device, Config.DEVICE_BATCH_TOKENS["cpu"]
+    )
+
+#---------------------------------------------------------------------------------------#
+def token_lengths(model: SentenceTransformer, texts: Sequence[str]) -> List[int]:
+    """Tokens each text occupies in the model input (special tokens included,
+    truncated to the model window) from one batched fast-tokenizer call"""
+    with tokenizer_lock(model.tokenizer):
+        encoded = model.tokenizer(
+            list(texts), truncation=True, max_length=model.max_seq_length
+        )["input_ids"]
+    return [len(ids) for ids in encoded]
+
+#---------------------------------------------------------------------------------------#
+def token_batches(lengths: Sequence[int], batch_tokens: int,
+                  max_batch_size: int = Config.EMBED_MAX_BATCH_SIZE) -> List[List[int]]:
+    """Group text indices, longest first, so rows x longest length fits the budget"""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches, batch = [], []
+    for i in order:
+        # Sorted descending, so the batch's first text is its longest
+        longest = lengths[batch[0]] if batch else lengths[i]
+        if batch and ((len(batch) + 1) * longest > batch_tokens or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+#---------------------------------------------------------------------------------------#
+def encode_bucketed(model: SentenceTransformer, texts: Sequence[str], batch_tokens: int) -> np.ndarray:
+    """Embed texts in length-sorted batches under the token budget, returning float32
+    rows in input order"""
+    texts = list(texts)
+    if len(texts) == 1:
+        # A single query needs no length bucketing
+        return np.asarray(
+            model.encode(texts, show_progress_bar=False, convert_to_numpy=True),
+            dtype=np.float32
+        ).reshape(1, -1)
+
+    embeddings = np.zeros((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    for batch in token_batches(token_lengths(model, texts), batch_tokens):
+        embeddings[batch] = model.encode(
+            [texts[i] for i in batch],
+            batch_size=len(batch),
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+    return embeddings
+
+#---------------------------------------------------------------------------------------#
+def parity_report(texts: Sequence[str], backends: Sequence[str] = ("onnx", "onnx-int8"),
+                  model_name: str = Config.MODEL_NAME, num_latency: int = 50) -> List[Dict]:
+    """Cosine drift of each backend's embeddings against torch, plus single-text
+    (query-style) encode latency and batch throughput"""
+    texts = list(texts)
+
+    def measure(model):
+        start = time.perf_counter()
+        embeddings = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+        throughput = len(texts) / (time.perf_counter() - start)
+
+        latencies = []
+        for text in texts[:num_latency]:
+            start = time.perf_counter()
+            model.encode([text], convert_to_numpy=True)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return np.asarray(embeddings, dtype=np.float32), throughput, np.asarray(latencies)
+
+    reference, throughput, latencies = measure(load_embedder("torch", model_name))
+    report = [{
+        "backend": "torch",
+        "mean_cosine": 1.0,
+        "min_cosine": 1.0,
+        "texts_per_s": throughput,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99))
+    }]
+
+    for backend in backends:
+        embeddings, throughput, latencies = measure(load_embedder(backend, model_name))
+        cosine = np.sum(reference * embeddings, axis=1)
+        report.append({
+            "backend": backend,
+            "mean_cosine": float(cosine.mean()),
+            "min_cosine": float(cosine.min()),
+            "texts_per_s": throughput,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99))
+        })
+        logger.info(f"{backend}: mean cosine {cosine.mean():.5f}, min {cosine.min():.5f}")
+
+    return report
+
+#---------------------------------------------------------------------------------------#
@@ -0,0 +1,62 @@
+#---------------------------------------------------------------------------------------#
+# embedding_codec.py
+#---------------------------------------------------------------------------------------#
+from bson.binary import Binary
+import numpy as np
+from core.config import Config
+
+#---------------------------------------------------------------------------------------#
+# Storage formats for the "embedding" field. Binary formats use BSON user-defined
+# subtypes so every stored value is self-describing and collections can mix formats.
+STORAGE_FORMATS = ("array", "float16", "int8")
+FLOAT16_SUBTYPE = 0x80
+INT8_SUBTYPE    = 0x81
+INT8_HEADER     = np.dtype("<f4").itemsize * 2  # scale, offset
+
+#---------------------------------------------------------------------------------------#
+def encode_embedding(embedding, storage: str = Config.EMBEDDING_STORAGE):
+    """Encode an embedding for MongoDB in the given storage format"""
+    vector = np.asarray(embedding, dtype=np.float32)
+
+    if storage == "array":
+        return vector.tolist()
+
+    if storage == "float16":
+        return Binary(vector.astype("<f2").tobytes(), FLOAT16_SUBTYPE)
+
+    if storage == "int8":
+        # Per-vector affine quantization: value = (code + 128) * scale + offset
+        offset = float(vector.min())
+        scale = (float(vector.max()) - offset) / 255.0 or 1.0
+        codes = np.clip(np.round((vector - offset) / scale) - 128, -128, 127).astype(np.int8)
+        header = np.asarray([scale, offset], dtype="<f4").tobytes()
+        return Binary(header + codes.tobytes(), INT8_SUBTYPE)
+
+    raise ValueError(f"Unknown embedding storage format: {storage}")
+
+#---------------------------------------------------------------------------------------#
+def decode_embedding(value) -> np.ndarray:
+    """Decode a stored embedding (array or Binary) into a float32 vector"""
+    if isinstance(value, Binary):
+        if value.subtype == FLOAT16_SUBTYPE:
+            return np.frombuffer(value, dtype="<f2").astype(np.float32)
+        if value.subtype == INT8_SUBTYPE:
+            scale, offset = np.frombuffer(value, dtype="<f4", count=2)
+            codes = np.frombuffer(value, dtype=np.int8, offset=INT8_HEADER)
+            return (codes.astype(np.float32) + 128) * scale + offset
+        raise ValueError(f"Unknown embedding Binary subtype: {value.subtype}")
+
+    return np.asarray(value, dtype=np.float32)
+
+#---------------------------------------------------------------------------------------#
+def storage_format(value) -> str:
+    """Name of the storage format a stored embedding uses"""
+    if isinstance(value, Binary):
+        if value.subtype == FLOAT16_SUBTYPE:
+            return "float16"
+        if value.subtype == INT8_SUBTYPE:
+            return "int8"
+        return f"binary:{value.subtype}"
+    return "array"
+
+#---------------------------------------------------------------------------------------#
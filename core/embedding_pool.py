@@ -0,0 +1,188 @@
+#---------------------------------------------------------------------------------------#
+# embedding_pool.py
+#---------------------------------------------------------------------------------------#
+import math
+import multiprocessing as mp
+import os
+import queue
+import time
+import traceback
+from typing import Dict, List, Optional, Sequence
+from loguru import logger
+import numpy as np
+from core.config import Config
+
+#---------------------------------------------------------------------------------------#
+def _available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+#---------------------------------------------------------------------------------------#
+def _worker_main(worker_id: int, cores: List[int], threads: int, backend: str,
+                 model_name: str, tasks, results):
+    """Worker process: pin to its cores, load the model once, embed tasks until None"""
+    try:
+        # Thread counts must be set before torch / ONNX Runtime are imported
+        for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[variable] = str(threads)
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+
+        from core.embedding_backend import load_embedder, encode_bucketed, device_batch_tokens
+        model = load_embedder(backend, model_name, device="cpu")
+        if backend == "torch":
+            import torch
+            torch.set_num_threads(threads)
+        batch_tokens = device_batch_tokens("cpu")
+        results.put(("ready", worker_id, None, 0.0))
+    except Exception:
+        results.put(("error", worker_id, traceback.format_exc(), 0.0))
+        return
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        epoch, seq, texts = task
+        try:
+            start = time.perf_counter()
+            embeddings = encode_bucketed(model, texts, batch_tokens)
+            results.put(("done", worker_id, (epoch, seq, embeddings), time.perf_counter() - start))
+        except Exception:
+            results.put(("error", worker_id, traceback.format_exc(), 0.0))
+
+#---------------------------------------------------------------------------------------#
+class EmbeddingPool:
+    """CPU embedding worker processes for bulk indexing.
+
+    Each worker is pinned to its own slice of cores with a matching intra-op
+    thread count, so workers do not fight over cores. encode() splits the texts
+    into tasks on a shared queue and reassembles the results in input order.
+    """
+
+    def __init__(self, workers: Optional[int] = Config.EMBEDDING_WORKERS,
+                 threads_per_worker: Optional[int] = None,
+                 backend: str = Config.EMBEDDING_BACKEND,
+                 model_name: str = Config.MODEL_NAME):
+        cores = _available_cores()
+        self.workers = max(1, min(workers or len(cores), len(cores)))
+        self.threads = threads_per_worker or max(1, len(cores) // self.workers)
+        self.texts_done: Dict[int, int] = {i: 0 for i in range(self.workers)}
+        self.busy_seconds: Dict[int, float] = {i: 0.0 for i in range(self.workers)}
+        self._epoch = 0  # Tags tasks so results of an aborted encode() are ignored
+
+        # spawn: forking a process that already initialized torch is unsafe
+        context = mp.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = []
+        for worker_id in range(self.workers):
+            worker_cores = cores[worker_id * self.threads:(worker_id + 1) * self.threads] or cores
+            process = context.Process(
+                target=_worker_main,
+                args=(worker_id, worker_cores, self.threads, backend, model_name,
+                      self._tasks, self._results),
+                daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+
+        # Wait until every worker has loaded the model (or report why it could not).
+        # A worker killed while loading (OOM, CUDA init) sends nothing, so poll
+        starting = set(range(self.workers))
+        while starting:
+            try:
+                status, worker_id, error, _ = self._results.get(timeout=5)
+            except queue.Empty:
+                dead = self._dead_workers(starting)
+                if dead:
+                    self.close()
+                    raise RuntimeError(f"Embedding workers exited while starting "
+                                       f"(worker: exit code): {dead}")
+                continue
+            if status == "error":
+                self.close()
+                raise RuntimeError(f"Embedding worker {worker_id} failed to start:\n{error}")
+            starting.discard(worker_id)
+        logger.info(f"Embedding pool ready: {self.workers} workers x {self.threads} threads "
+                    f"({backend})")
+
+    #----------------------------------------------------------------------------------#
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts across the workers and return float32 rows in input order"""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, Config.VECTOR_DIMENSION), dtype=np.float32)
+
+        # Two tasks per worker keeps every worker busy when task times differ
+        task_size = max(1, math.ceil(len(texts) / (self.workers * 2)))
+        starts = range(0, len(texts), task_size)
+        self._epoch += 1
+        for seq, start in enumerate(starts):
+            self._tasks.put((self._epoch, seq, texts[start:start + task_size]))
+
+        parts: Dict[int, np.ndarray] = {}
+        while len(parts) < len(starts):
+            try:
+                status, worker_id, payload, seconds = self._results.get(timeout=5)
+            except queue.Empty:
+                dead = self._dead_workers(range(self.workers))
+                if dead:
+                    raise RuntimeError(f"Embedding workers exited unexpectedly "
+                                       f"(worker: exit code): {dead}")
+                continue
+            if status == "error":
+                raise RuntimeError(f"Embedding worker {worker_id} failed:\n{payload}")
+            epoch, seq, embeddings = payload
+            if epoch != self._epoch:
+                continue
+            parts[seq] = embeddings
+            self.texts_done[worker_id] += len(embeddings)
+            self.busy_seconds[worker_id] += seconds
+
+        return np.vstack([parts[seq] for seq in range(len(starts))])
+
+    #----------------------------------------------------------------------------------#
+    def _dead_workers(self, worker_ids) -> Dict[int, Optional[int]]:
+        """{worker_id: exit code} of the given workers that are no longer running"""
+        return {i: self._processes[i].exitcode for i in worker_ids
+                if not self._processes[i].is_alive()}
+
+    #----------------------------------------------------------------------------------#
+    def stats(self) -> List[dict]:
+        """Texts embedded and throughput per worker"""
+        return [{
+            "worker": worker_id,
+            "texts": self.texts_done[worker_id],
+            "seconds": self.busy_seconds[worker_id],
+            "texts_per_s": self.texts_done[worker_id] / self.busy_seconds[worker_id]
+            if self.busy_seconds[worker_id] else 0.0
+        } for worker_id in range(self.workers)]
+
+    #----------------------------------------------------------------------------------#
+    def log_stats(self):
+        """Log per-worker throughput"""
+        for row in self.stats():
+            logger.info(f"Embedding worker {row['worker']}: {row['texts']} texts, "
+                        f"{row['texts_per_s']:.1f} texts/s")
+
+    #----------------------------------------------------------------------------------#
+    def close(self):
+        """Stop the workers"""
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    #----------------------------------------------------------------------------------#
+    def __enter__(self) -> "EmbeddingPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+#---------------------------------------------------------------------------------------#
@@ -0,0 +1,101 @@
+#---------------------------------------------------------------------------------------#
+# extractive.py
+#---------------------------------------------------------------------------------------#
+import re
+from typing import Dict, List, Sequence
+import numpy as np
+from core.config import Config
+from core.data_ingestion import source_offset
+
+# End of a sentence: . ! or ? (optionally closing quotes / brackets) before whitespace
+SENTENCE_BREAK = re.compile(r'[.!?]["\')\]]*\s+')
+
+#---------------------------------------------------------------------------------------#
+def split_sentences(chunks: Sequence[dict], min_chars: int = Config.EXTRACTIVE_MIN_CHARS) -> List[dict]:
+    """Sentences of the chunks with their position.
+
+    `chunk_offset` is the sentence's offset in the chunk content; `start_char` /
+    `end_char` are its span in the source file, mapped through the chunk's
+    anchors. Sentences repeated by chunk overlap are kept once.
+    """
+    sentences, seen = [], set()
+    for chunk in chunks:
+        content = chunk.get("content", "")
+        start = 0
+        breaks = [match.end() for match in SENTENCE_BREAK.finditer(content)] + [len(content)]
+        for end in breaks:
+            text = content[start:end].strip()
+            offset = start + len(content[start:end]) - len(content[start:end].lstrip())
+            start = end
+            if len(text) < min_chars or text in seen:
+                continue
+            seen.add(text)
+            sentences.append({
+                "text": text,
+                "doc_id": chunk.get("doc_id"),
+                "chunk_id": chunk.get("chunk_id"),
+                "chunk_offset": offset,
+                "start_char": source_offset(chunk, offset),
+                "end_char": source_offset(chunk, offset + len(text) - 1) + 1
+            })
+    return sentences
+
+#---------------------------------------------------------------------------------------#
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int,
+               lambda_: float = Config.EXTRACTIVE_LAMBDA) -> List[int]:
+    """Maximal marginal relevance over unit vectors: each pick maximizes
+    lambda * sim(query) - (1 - lambda) * max sim(already picked). One matrix-vector
+    product per pick keeps the redundancy term up to date for all candidates."""
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+
+    relevance = candidates @ query
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = []
+    for _ in range(min(k, n)):
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        redundancy = np.maximum(redundancy, candidates @ candidates[pick])
+    return selected
+
+#---------------------------------------------------------------------------------------#
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / (np.linalg.norm(vectors, axis=-1, keepdims=True) + 1e-12)
+
+#---------------------------------------------------------------------------------------#
+class ExtractiveAnswerer:
+    """Answer from the retrieved chunks' own sentences, without a seq2seq model.
+
+    Sentences are embedded in one batch with the retrieval model, scored against
+    the query embedding, and a relevant but diverse subset is picked with MMR.
+    """
+
+    def __init__(self, vectorization, num_sentences: int = Config.EXTRACTIVE_SENTENCES,
+                 lambda_: float = Config.EXTRACTIVE_LAMBDA):
+        self.vectorization = vectorization
+        self.num_sentences = num_sentences
+        self.lambda_ = lambda_
+
+    #----------------------------------------------------------------------------------#
+    def answer(self, query_embedding, chunks: Sequence[dict]) -> Dict:
+        """Selected sentences (in source order, with relevance and offsets) and their text"""
+        sentences = split_sentences(chunks)
+        if not sentences:
+            return {"text": "", "sentences": []}
+
+        embeddings = _normalize(self.vectorization.generate_embeddings([s["text"] for s in sentences]))
+        query = _normalize(query_embedding)
+        picks = mmr_select(query, embeddings, self.num_sentences, self.lambda_)
+        relevance = embeddings[picks] @ query
+
+        selected = [{**sentences[i], "score": float(score)} for i, score in zip(picks, relevance)]
+        # Read in document order, not selection order
+        selected.sort(key=lambda s: (str(s["doc_id"]), s["start_char"]))
+        return {"text": " ".join(s["text"] for s in selected), "sentences": selected}
+
+#---------------------------------------------------------------------------------------#
@@ -0,0 +1,27 @@
+#---------------------------------------------------------------------------------------#
+# fusion.py
+#---------------------------------------------------------------------------------------#
+from typing import Dict, List, Optional, Sequence, Tuple
+from core.config import Config
+from core.vector_index import ChunkKey
+
+#---------------------------------------------------------------------------------------#
+def reciprocal_rank_fusion(ranked_lists: Sequence[Sequence[Tuple[ChunkKey, float]]],
+                           weights: Optional[Sequence[float]] = None,
+                           k: int = Config.RRF_K) -> List[Tuple[ChunkKey, float]]:
+    """Merge ranked ((doc_id, chunk_id), score) lists with weighted reciprocal-rank fusion.
+
+    Only ranks are used, so scores on different scales (cosine similarity and
+    MongoDB textScore) can be combined: fused = sum(weight / (k + rank)).
+    """
+    if weights is None:
+        weights = [1.0] * len(ranked_lists)
+
+    fused: Dict[ChunkKey, float] = {}
+    for hits, weight in zip(ranked_lists, weights):
+        for rank, (key, _) in enumerate(hits, 1):
+            fused[key] = fused.get(key, 0.0) + weight / (k + rank)
+
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+#---------------------------------------------------------------------------------------#
@@ -0,0 +1,254 @@
+#---------------------------------------------------------------------------------------#
+# generation.py
+#---------------------------------------------------------------------------------------#
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Dict, Iterator, List, Optional, Sequence
+from loguru import logger
+import numpy as np
+import torch
+from transformers import (AutoModelForSeq2SeqLM, AutoTokenizer, StoppingCriteria,
+                          StoppingCriteriaList, TextIteratorStreamer)
+from core.config import Config
+from core.context import build_context
+from core.tokenizer_lock import tokenizer_lock
+
+#---------------------------------------------------------------------------------------#
+class StopOnEvent(StoppingCriteria):
+    """Ends generate() at the next decoding step once the event is set (cancellation)"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.event.is_set()
+
+#---------------------------------------------------------------------------------------#
+class LockedTextIteratorStreamer(TextIteratorStreamer):
+    """TextIteratorStreamer that decodes under the tokenizer lock (see tokenizer_lock)"""
+
+    def put(self, value):
+        with tokenizer_lock(self.tokenizer):
+            super().put(value)
+
+    def end(self):
+        with tokenizer_lock(self.tokenizer):
+            super().end()
+
+#---------------------------------------------------------------------------------------#
+class Summarizer:
+    """Seq2seq summarizer configured by a generation profile (Config.GENERATION_PROFILES).
+
+    A profile names the model, whether to quantize its linear layers to int8 on CPU
+    and the decoding settings. The model is loaded on first use. Tokenizer calls
+    hold the tokenizer's lock, so concurrent requests can share one summarizer.
+    """
+
+    def __init__(self, profile: str = Config.GENERATION_PROFILE):
+        if profile not in Config.GENERATION_PROFILES:
+            raise ValueError(f"Unknown generation profile '{profile}', "
+                             f"expected one of {list(Config.GENERATION_PROFILES)}")
+        self.profile = profile
+        self.settings = Config.GENERATION_PROFILES[profile]
+        self.model_name = self.settings["model"]
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self._tokenizer = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    #----------------------------------------------------------------------------------#
+    def load(self):
+        """Load (and on CPU optionally quantize) the model, once"""
+        with self._lock:
+            if self._model is not None:
+                return
+            logger.info(f"Loading summarization model: {self.model_name} (profile '{self.profile}')")
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+
+            if self.device.type == "cuda":
+                model = AutoModelForSeq2SeqLM.from_pretrained(
+                    self.model_name, torch_dtype=torch.float16
+                ).to(self.device)
+            else:
+                model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name)
+                if self.settings.get("quantize"):
+                    # Dynamic int8 weights for the Linear layers, activations stay float
+                    model = torch.quantization.quantize_dynamic(
+                        model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
+                    logger.info("Quantized summarization model to dynamic int8")
+
+            model.eval()
+            self._tokenizer, self._model = tokenizer, model
+
+    #----------------------------------------------------------------------------------#
+    def generate_kwargs(self) -> dict:
+        """Decoding settings of the profile, as model.generate() arguments"""
+        num_beams = self.settings.get("num_beams", 1)
+        kwargs = {
+            "max_length": self.settings["max_length"],
+            "min_length": self.settings["min_length"],
+            "num_beams": num_beams,
+            "do_sample": False
+        }
+        if num_beams > 1:
+            kwargs["length_penalty"] = self.settings.get("length_penalty", 1.0)
+            kwargs["early_stopping"] = True
+        if self.settings.get("no_repeat_ngram_size"):
+            kwargs["no_repeat_ngram_size"] = self.settings["no_repeat_ngram_size"]
+        return kwargs
+
+    #----------------------------------------------------------------------------------#
+    def _input_window(self) -> int:
+        return min(self._tokenizer.model_max_length, 1024)
+
+    #----------------------------------------------------------------------------------#
+    def build_context(self, chunks: Sequence[dict]) -> str:
+        """Summarizer input from retrieved chunks: overlapping chunks merged, packed
+        by score into the input window (or CONTEXT_MAX_TOKENS)"""
+        self.load()
+        with tokenizer_lock(self._tokenizer):
+            budget = self._input_window() - self._tokenizer.num_special_tokens_to_add()
+            if Config.CONTEXT_MAX_TOKENS:
+                budget = min(budget, Config.CONTEXT_MAX_TOKENS)
+            return build_context(chunks, self._tokenizer, budget)
+
+    #----------------------------------------------------------------------------------#
+    def _encode(self, text: str):
+        """Tokenize text, truncated to the model's input window"""
+        self.load()
+        with tokenizer_lock(self._tokenizer):
+            encoded = self._tokenizer(
+                text,
+                return_tensors="pt",
+                truncation=True,
+                max_length=self._input_window()
+            )
+        return encoded.to(self.device)
+
+    #----------------------------------------------------------------------------------#
+    def summarize(self, text: str, stop: Optional[threading.Event] = None) -> str:
+        """Summarize text (truncated to the model's input window). Setting `stop`
+        from another thread cuts generation short"""
+        inputs = self._encode(text)
+        kwargs = self.generate_kwargs()
+        if stop is not None:
+            kwargs["stopping_criteria"] = StoppingCriteriaList([StopOnEvent(stop)])
+
+        with torch.no_grad():
+            summary_ids = self._model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                **kwargs
+            )
+
+        with tokenizer_lock(self._tokenizer):
+            return self._tokenizer.decode(
+                summary_ids[0],
+                skip_special_tokens=True,
+                clean_up_tokenization_spaces=True
+            )
+
+    #----------------------------------------------------------------------------------#
+    def stream(self, text: str, stop: Optional[threading.Event] = None,
+               executor: Optional[Executor] = None) -> Iterator[str]:
+        """Summarize text, yielding decoded text increments as tokens are generated.
+
+        generate() runs on a background thread (or the given executor) feeding a
+        TextIteratorStreamer. Streamers cannot follow beam search, so decoding is
+        greedy here. Setting `stop` ends generation at the next token.
+        """
+        inputs = self._encode(text)
+        streamer = LockedTextIteratorStreamer(
+            self._tokenizer,
+            timeout=Config.STREAM_TOKEN_TIMEOUT,
+            skip_special_tokens=True,
+            clean_up_tokenization_spaces=True
+        )
+        kwargs = {**self.generate_kwargs(), "num_beams": 1}
+        kwargs.pop("length_penalty", None)
+        kwargs.pop("early_stopping", None)
+        if stop is not None:
+            kwargs["stopping_criteria"] = StoppingCriteriaList([StopOnEvent(stop)])
+
+        error = []
+
+        def generate():
+            try:
+                with torch.no_grad():
+                    self._model.generate(
+                        inputs["input_ids"],
+                        attention_mask=inputs["attention_mask"],
+                        streamer=streamer,
+                        **kwargs
+                    )
+            except Exception as e:
+                error.append(e)
+                streamer.end()
+
+        if executor is not None:
+            done = executor.submit(generate).result
+        else:
+            thread = threading.Thread(target=generate, name="summary-stream", daemon=True)
+            thread.start()
+            done = thread.join
+        for piece in streamer:
+            if piece:
+                yield piece
+        done()
+        if error:
+            raise error[0]
+
+#---------------------------------------------------------------------------------------#
+def compare_profiles(contexts: Sequence[Sequence[dict]], profiles: Optional[Sequence[str]] = None,
+                     reference: str = "quality") -> List[Dict]:
+    """Latency of each generation profile and ROUGE F1 of its summaries against the
+    reference profile's (full beam search) summaries of the same contexts (each a
+    list of retrieved chunks)"""
+    from rouge import Rouge
+
+    contexts = list(contexts)
+    profiles = [p for p in (profiles or Config.GENERATION_PROFILES) if p != reference]
+    rouge = Rouge()
+
+    def run(profile):
+        summarizer = Summarizer(profile)
+        summarizer.load()  # Keep model loading out of the latencies
+        summaries, latencies = [], []
+        for chunks in contexts:
+            start = time.perf_counter()
+            summaries.append(summarizer.summarize(summarizer.build_context(chunks)))
+            latencies.append(time.perf_counter() - start)
+        return summaries, np.asarray(latencies)
+
+    def row(profile, latencies, scores):
+        settings = Config.GENERATION_PROFILES[profile]
+        return {
+            "profile": profile,
+            "model": settings["model"],
+            "quantize": bool(settings.get("quantize")),
+            "num_beams": settings.get("num_beams", 1),
+            "mean_s": float(latencies.mean()),
+            "p90_s": float(np.percentile(latencies, 90)),
+            **scores
+        }
+
+    references, latencies = run(reference)
+    report = [row(reference, latencies, {"rouge1": 1.0, "rouge2": 1.0, "rougeL": 1.0})]
+
+    for profile in profiles:
+        summaries, latencies = run(profile)
+        pairs = [(s, r) for s, r in zip(summaries, references) if s.strip() and r.strip()]
+        scores = rouge.get_scores(*zip(*pairs), avg=True) if pairs else {}
+        report.append(row(profile, latencies, {
+            "rouge1": scores.get("rouge-1", {}).get("f", 0.0),
+            "rouge2": scores.get("rouge-2", {}).get("f", 0.0),
+            "rougeL": scores.get("rouge-l", {}).get("f", 0.0)
+        }))
+        logger.info(f"{profile}: mean {latencies.mean():.2f}s, "
+                    f"ROUGE-L {report[-1]['rougeL']:.3f} vs {reference}")
+
+    return report
+
+#---------------------------------------------------------------------------------------#
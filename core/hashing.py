@@ -0,0 +1,20 @@
+#---------------------------------------------------------------------------------------#
+# hashing.py
+#---------------------------------------------------------------------------------------#
+import hashlib
+
+#---------------------------------------------------------------------------------------#
+def content_hash(text: str) -> str:
+    """Stable hex digest of a chunk's content, used to detect unchanged chunks"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+#---------------------------------------------------------------------------------------#
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """Hex digest of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+#---------------------------------------------------------------------------------------#
@@ -1,127 +1,325 @@
 # query.py
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import threading
 import torch
-from transformers import BartForConditionalGeneration, BartTokenizer
 from loguru import logger
 from core.config import Config
+from core.cache import AnswerCache, QueryEmbeddingCache
 from core.database import Database
+from core.extractive import ExtractiveAnswerer
+from core.fusion import reciprocal_rank_fusion
+from core.generation import Summarizer
 from core.vectorization import VectorizationPipeline
 
 
 class QueryEngine:
     def __init__(self):
-        """Initialize the query engine with necessary components"""
+        """Initialize the query engine with necessary components.
+
+        The async methods never block the event loop: MongoDB and index work runs on
+        an I/O thread pool, embedding and generation on pools bounded by
+        EMBED_CONCURRENCY and GENERATION_CONCURRENCY, so one request's I/O overlaps
+        another's inference.
+        """
         self.db = Database()
-        self.vectorization = VectorizationPipeline()
+        self.io_pool = ThreadPoolExecutor(Config.QUERY_IO_WORKERS, thread_name_prefix="query-io")
+        self.embed_pool = ThreadPoolExecutor(Config.EMBED_CONCURRENCY, thread_name_prefix="query-embed")
+        self.generate_pool = ThreadPoolExecutor(Config.GENERATION_CONCURRENCY,
+                                                thread_name_prefix="query-generate")
+        # Queries have their own cache; the chunk embedding cache is for indexing
+        self.vectorization = VectorizationPipeline(use_cache=False)
+        self.query_cache = QueryEmbeddingCache()
+        self.answer_cache = AnswerCache()
         
         # Set up device configuration
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"Using device: {self.device}")
         
-        # Initialize BART model and tokenizer explicitly
-        # This avoids pipeline task name compatibility issues
-        model_name = "facebook/bart-large-cnn"
-        logger.info(f"Loading summarization model: {model_name}")
-        
-        self.tokenizer = BartTokenizer.from_pretrained(model_name)
-        
-        if torch.cuda.is_available():
-            self.model = BartForConditionalGeneration.from_pretrained(
-                model_name,
-                torch_dtype=torch.float16
-            ).to(self.device)
-        else:
-            self.model = BartForConditionalGeneration.from_pretrained(
-                model_name
-            ).to(self.device)
-        
-        self.model.eval()  # Set to evaluation mode
+        # Extractive answers reuse the embedding model, so no seq2seq model is loaded
+        self.answer_mode = Config.ANSWER_MODE
+        self.summarizer = None
+        self.extractor = ExtractiveAnswerer(self.vectorization)
+        if self.answer_mode == "abstractive":
+            # Summarization model and decoding come from the generation profile
+            self.summarizer = Summarizer(Config.GENERATION_PROFILE)
+            self.summarizer.load()
+        elif self.answer_mode != "extractive":
+            raise ValueError(f"Unknown answer mode '{self.answer_mode}', "
+                             f"expected 'abstractive' or 'extractive'")
+
+        # Load the in-process vector index up front so the first query is fast
+        logger.info(f"Vector index ready: {len(self.db.vector_index)} chunks")
         
         logger.info("Initialized orthomolecular query engine")
 
-    async def search(self, query: str, top_k: int = Config.TOP_K) -> List[dict]:
-        """Perform vector similarity search on orthomolecular chunks"""
+    def embed_query(self, query: str):
+        """Embed a query, reusing cached embeddings for repeated questions"""
+        embedding = self.query_cache.get(query)
+        if embedding is None:
+            embedding = self.vectorization.generate_embeddings([query])[0]
+            self.query_cache.put(query, embedding)
+        return embedding
+
+    @staticmethod
+    async def _run(pool: ThreadPoolExecutor, func, *args, **kwargs):
+        """Run a blocking call on one of the engine's thread pools"""
+        return await asyncio.get_running_loop().run_in_executor(pool, partial(func, *args, **kwargs))
+
+    async def search(self, query: str, top_k: int = Config.TOP_K, mode: Optional[str] = None,
+                     documents: Optional[List[str]] = None,
+                     timeout: Optional[float] = Config.SEARCH_TIMEOUT) -> List[dict]:
+        """Perform vector (or hybrid lexical + vector) search on orthomolecular chunks,
+        optionally restricted to the given doc_ids"""
         try:
-            # Generate query embedding
-            query_embedding = self.vectorization.generate_embeddings([query])[0]
-            logger.info(f"Searching for: {query}")
-            
-            # Get similar chunks
-            similar_chunks = self.db.get_similar_chunks(
-                query_embedding=query_embedding,
-                top_k=top_k
+            mode = mode or Config.SEARCH_MODE
+            logger.info(f"Searching for: {query} ({mode})")
+            similar_chunks = await asyncio.wait_for(
+                self._search(query, top_k, mode, documents), timeout
             )
-            
             logger.info(f"Found {len(similar_chunks)} relevant chunks")
             return similar_chunks
-            
+
+        except asyncio.TimeoutError:
+            logger.warning(f"Search timed out after {timeout}s: {query}")
+            return []
         except Exception as e:
             logger.error(f"Search error: {str(e)}")
             return []
 
-    async def generate_response(self, query: str, chunks: List[dict]) -> str:
-        """Generate a response based on the query and retrieved chunks"""
+    async def _search(self, query: str, top_k: int, mode: str,
+                      documents: Optional[List[str]]) -> List[dict]:
+        if mode == "hybrid":
+            hits = await self._hybrid_hits(query, top_k, documents)
+            return await self._run(self.io_pool, self.db.fetch_chunks, hits)
+
+        # Generate query embedding
+        query_embedding = await self._run(self.embed_pool, self.embed_query, query)
+
+        # Get similar chunks
+        return await self._run(
+            self.io_pool, self.db.get_similar_chunks,
+            query_embedding=query_embedding,
+            top_k=top_k,
+            documents=documents
+        )
+
+    async def search_many(self, queries: List[str], top_k: int = Config.TOP_K,
+                          documents: Optional[List[str]] = None,
+                          timeout: Optional[float] = Config.SEARCH_TIMEOUT) -> List[List[dict]]:
+        """Vector search for many queries: one encode batch, one scoring pass and one
+        content fetch for the whole batch"""
+        if not queries:
+            return []
+        try:
+            results = await asyncio.wait_for(self._search_many(queries, top_k, documents), timeout)
+            logger.info(f"Searched {len(queries)} queries")
+            return results
+
+        except asyncio.TimeoutError:
+            logger.warning(f"Batch search of {len(queries)} queries timed out after {timeout}s")
+            return [[] for _ in queries]
+        except Exception as e:
+            logger.error(f"Batch search error: {str(e)}")
+            return [[] for _ in queries]
+
+    async def _search_many(self, queries: List[str], top_k: int,
+                           documents: Optional[List[str]]) -> List[List[dict]]:
+        query_embeddings = await self._run(self.embed_pool, self._embed_many, queries)
+        return await self._run(
+            self.io_pool, self.db.get_similar_chunks_many,
+            query_embeddings, top_k=top_k, documents=documents
+        )
+
+    def _embed_many(self, queries: List[str]) -> list:
+        """Query embeddings from the cache, encoding all misses in a single batch"""
+        query_embeddings = [self.query_cache.get(query) for query in queries]
+        missing = [i for i, embedding in enumerate(query_embeddings) if embedding is None]
+        if missing:
+            encoded = self.vectorization.generate_embeddings([queries[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                query_embeddings[i] = embedding
+                self.query_cache.put(queries[i], embedding)
+        return query_embeddings
+
+    async def _hybrid_hits(self, query: str, top_k: int,
+                           documents: Optional[List[str]] = None) -> List[tuple]:
+        """Run $text and vector retrieval concurrently and fuse them with RRF"""
+        async def vector_hits():
+            query_embedding = await self._run(self.embed_pool, self.embed_query, query)
+            return await self._run(
+                self.io_pool, self.db.vector_search,
+                query_embedding, Config.HYBRID_VECTOR_CANDIDATES, documents=documents
+            )
+
+        vector_hits, text_hits = await asyncio.gather(
+            vector_hits(),
+            self._run(
+                self.io_pool, self.db.text_search, query, Config.HYBRID_TEXT_CANDIDATES, documents
+            )
+        )
+        logger.info(f"Hybrid candidates: {len(vector_hits)} vector, {len(text_hits)} text")
+
+        fused = reciprocal_rank_fusion(
+            [vector_hits, text_hits],
+            weights=[Config.HYBRID_VECTOR_WEIGHT, Config.HYBRID_TEXT_WEIGHT],
+            k=Config.RRF_K
+        )
+        return fused[:top_k]
+
+    def extract_answer(self, query: str, chunks: List[dict]) -> Dict:
+        """Extractive answer: the most relevant, mutually diverse sentences of the
+        chunks, each with its score, doc_id, chunk_id and start_char/end_char"""
+        return self.extractor.answer(self.embed_query(query), chunks)
+
+    async def _cache_lookup(self, query: str, chunks: List[dict]):
+        """Answer cache key parts and any cached answer for these chunks / this query"""
+        chunk_ids = [(chunk.get('doc_id'), chunk.get('chunk_id')) for chunk in chunks]
+        query_embedding, version = await asyncio.gather(
+            self._run(self.embed_pool, self.embed_query, query),
+            self._run(self.io_pool, self.db.embeddings_version)
+        )
+        # Extractive answers rank sentences against the query, so the same chunks
+        # retrieved for a different question must not reuse them
+        return chunk_ids, query_embedding, version, self.answer_cache.get(
+            chunk_ids, query_embedding, version, exact=self.summarizer is not None
+        )
+
+    def _summarize(self, chunks: List[dict], stop: threading.Event) -> str:
+        # Merge overlapping chunks into a token-budgeted context and summarize it
+        return self.summarizer.summarize(self.summarizer.build_context(chunks), stop=stop)
+
+    async def generate_response(self, query: str, chunks: List[dict],
+                                timeout: Optional[float] = Config.GENERATION_TIMEOUT) -> str:
+        """Generate a response based on the query and retrieved chunks. On timeout or
+        cancellation, generation is stopped at the next token"""
         # Clear GPU memory before processing
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
 
+        if not chunks:
+            return "No relevant information found in the orthomolecular medicine text."
+
+        stop = threading.Event()
+        try:
+            return await asyncio.wait_for(self._generate_response(query, chunks, stop), timeout)
+
+        except asyncio.TimeoutError:
+            logger.warning(f"Response generation timed out after {timeout}s")
+            return "I apologize, but generating a response took too long."
+        except Exception as e:
+            logger.error(f"Response generation error: {str(e)}")
+            return "I apologize, but I encountered an error generating a response."
+        finally:
+            # The executor thread cannot be interrupted; this ends generate() instead
+            stop.set()
+
+    async def _generate_response(self, query: str, chunks: List[dict], stop: threading.Event) -> str:
+        # Repeat questions (same chunks or a near-duplicate query) skip generation
+        chunk_ids, query_embedding, version, cached = await self._cache_lookup(query, chunks)
+        if cached is not None:
+            logger.info("Answer cache hit")
+            return cached
+
+        if self.summarizer is None:
+            answer = await self._run(self.embed_pool, self.extractor.answer, query_embedding, chunks)
+            summary = answer["text"]
+        else:
+            summary = await self._run(self.generate_pool, self._summarize, chunks, stop)
+
+        # Format final response
+        response = (
+            f"Based on the orthomolecular medicine text:\n\n"
+            f"{summary}"
+        ).strip()
+
+        self.answer_cache.put(chunk_ids, query_embedding, response, version)
+        return response
+
+    async def generate_response_stream(self, query: str, chunks: List[dict],
+                                       timeout: Optional[float] = Config.GENERATION_TIMEOUT
+                                       ) -> AsyncIterator[str]:
+        """Like generate_response, but yield the answer as text increments while it is
+        generated. Streaming cannot follow beam search, so a profile with num_beams > 1
+        yields its beam-searched answer whole: both paths give, and cache, the same
+        answer for a question. Closing the generator early or the timeout stops
+        generation"""
+        if not chunks:
+            yield "No relevant information found in the orthomolecular medicine text."
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+
+        def remaining():
+            return None if deadline is None else max(deadline - loop.time(), 0)
+
+        stop = threading.Event()
         try:
-            if not chunks:
-                return "No relevant information found in the orthomolecular medicine text."
-                
-            # Combine chunk contents
-            context_parts = []
-            for i, chunk in enumerate(chunks, 1):
-                score = chunk.get('score', 0.0)
-                content = chunk.get('content', '')
-                context_parts.append(
-                    f"Chunk {i} (Relevance: {score:.3f}):\n{content}\n"
+            chunk_ids, query_embedding, version, cached = await asyncio.wait_for(
+                self._cache_lookup(query, chunks), remaining()
+            )
+            if cached is not None:
+                logger.info("Answer cache hit")
+                yield cached
+                return
+
+            prefix = "Based on the orthomolecular medicine text:\n\n"
+            if self.summarizer is None:
+                # Extractive answers take milliseconds, there is nothing to stream
+                answer = await asyncio.wait_for(
+                    self._run(self.embed_pool, self.extractor.answer, query_embedding, chunks),
+                    remaining()
                 )
-            
-            context = "\n".join(context_parts)
-            
-            # Tokenize input with truncation (BART max length is 1024)
-            inputs = self.tokenizer(
-                context,
-                return_tensors="pt",
-                truncation=True,
-                max_length=1024
-            ).to(self.device)
-            
-            # Generate summary
-            with torch.no_grad():
-                summary_ids = self.model.generate(
-                    inputs["input_ids"],
-                    attention_mask=inputs["attention_mask"],
-                    max_length=Config.MAX_LENGTH,
-                    min_length=Config.MIN_LENGTH,
-                    num_beams=4,
-                    length_penalty=2.0,
-                    early_stopping=True,
-                    do_sample=False
+                response = (prefix + answer["text"]).strip()
+                self.answer_cache.put(chunk_ids, query_embedding, response, version)
+                yield response
+                return
+
+            if self.summarizer.settings.get("num_beams", 1) > 1:
+                summary = await asyncio.wait_for(
+                    self._run(self.generate_pool, self._summarize, chunks, stop), remaining()
                 )
-            
-            # Decode the generated summary
-            summary = self.tokenizer.decode(
-                summary_ids[0],
-                skip_special_tokens=True,
-                clean_up_tokenization_spaces=True
-            )
-            
-            # Format final response
-            response = (
-                f"Based on the orthomolecular medicine text:\n\n"
-                f"{summary}"
+                response = (prefix + summary).strip()
+                self.answer_cache.put(chunk_ids, query_embedding, response, version)
+                yield response
+                return
+
+            yield prefix
+            context = await asyncio.wait_for(
+                self._run(self.io_pool, self.summarizer.build_context, chunks), remaining()
             )
-            
-            return response.strip()
-            
+            # generate() takes a generation slot; the streamer blocks between tokens,
+            # so each one is awaited on an I/O thread
+            pieces = self.summarizer.stream(context, stop=stop, executor=self.generate_pool)
+            summary = []
+            while True:
+                piece = await asyncio.wait_for(self._run(self.io_pool, next, pieces, None), remaining())
+                if piece is None:
+                    break
+                summary.append(piece)
+                yield piece
+
+            self.answer_cache.put(chunk_ids, query_embedding, (prefix + "".join(summary)).strip(), version)
+
+        except asyncio.TimeoutError:
+            logger.warning(f"Response streaming timed out after {timeout}s")
+            yield "\n\n[Response cut short: generation took too long]"
         except Exception as e:
-            logger.error(f"Response generation error: {str(e)}")
-            return "I apologize, but I encountered an error generating a response."
+            logger.error(f"Response streaming error: {str(e)}")
+            yield "I apologize, but I encountered an error generating a response."
+        finally:
+            stop.set()
 
     def close(self):
         """Cleanup resources"""
+        logger.info(f"Query embedding cache: {self.query_cache.stats()}")
+        logger.info(f"Answer cache: {self.answer_cache.stats()}")
+        for pool in (self.io_pool, self.embed_pool, self.generate_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.query_cache.close()
         self.db.close()
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
@@ -0,0 +1,170 @@
+#---------------------------------------------------------------------------------------#
+# snapshot.py
+#---------------------------------------------------------------------------------------#
+import glob
+import json
+import os
+import re
+import tempfile
+import zlib
+from typing import Optional
+from loguru import logger
+import numpy as np
+from core.config import Config
+from core.vector_index import VectorIndex, VectorPartition
+
+SNAPSHOT_FORMAT = 2
+KEEP_VERSIONS = 2  # Newest versions left on disk for readers that just read an older manifest
+
+#---------------------------------------------------------------------------------------#
+def _replace_atomically(path: str, write, mode: str = 'wb'):
+    """Write to a temporary file private to this writer, then rename it over path"""
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+#---------------------------------------------------------------------------------------#
+class EmbeddingSnapshot:
+    """Versioned on-disk copy of the normalized embedding matrix.
+
+    The matrix is stored as a float32 .npy file, rows grouped by document, next to a
+    chunk_id offset table and a manifest holding each document's row range. Readers
+    memory-map it read-only, so every worker process on a host shares one page-cache
+    copy instead of pulling the collection from MongoDB.
+    """
+
+    def __init__(self, directory: str = Config.SNAPSHOT_DIR):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+
+    #----------------------------------------------------------------------------------#
+    def _paths(self, version: int):
+        return (os.path.join(self.directory, f"embeddings-v{version}.npy"),
+                os.path.join(self.directory, f"chunk_ids-v{version}.npy"))
+
+    #----------------------------------------------------------------------------------#
+    def read_manifest(self) -> Optional[dict]:
+        """Return the current manifest, or None if no snapshot was written"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    #----------------------------------------------------------------------------------#
+    def write(self, index: VectorIndex, version: int):
+        """Write the index as snapshot `version` and atomically switch the manifest"""
+        os.makedirs(self.directory, exist_ok=True)
+        vectors_path, ids_path = self._paths(version)
+
+        # Rows are grouped by document; the manifest records each partition's row range
+        partitions, start = [], 0
+        for doc_id, partition in sorted(index.partitions.items()):
+            partitions.append([doc_id, start, start + len(partition)])
+            start += len(partition)
+        chunk_ids = np.concatenate(
+            [index.partitions[doc_id].chunk_ids for doc_id, _, _ in partitions]
+        ) if partitions else np.zeros(0, dtype=np.int64)
+        matrix = np.vstack(
+            [index.partitions[doc_id].matrix for doc_id, _, _ in partitions]
+        ) if partitions else np.zeros((0, Config.VECTOR_DIMENSION), dtype=np.float32)
+
+        for path, array in ((vectors_path, matrix), (ids_path, chunk_ids)):
+            _replace_atomically(path, lambda f, array=array: np.save(f, np.ascontiguousarray(array)))
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "version": version,
+            "count": len(index),
+            "dimension": Config.VECTOR_DIMENSION,
+            "model": Config.MODEL_NAME,
+            "partitions": partitions,
+            "ids_checksum": self._checksum(chunk_ids, partitions)
+        }
+        _replace_atomically(self.manifest_path, lambda f: json.dump(manifest, f, indent=2), 'w')
+        self._remove_old_versions()
+
+        logger.info(f"Wrote embedding snapshot v{version}: {len(index)} chunks "
+                    f"in {len(partitions)} documents")
+
+    #----------------------------------------------------------------------------------#
+    def _remove_old_versions(self):
+        """Delete all but the KEEP_VERSIONS newest versions on disk.
+
+        Processes that already mapped an older version keep their (unlinked) files.
+        The previous version is kept for readers that read its manifest just before
+        the switch; the newest versions, whoever wrote them, are never touched.
+        """
+        files = {}
+        for path in glob.glob(os.path.join(self.directory, "*-v*.npy")):
+            match = re.search(r"-v(\d+)\.npy$", path)
+            if match:
+                files.setdefault(int(match.group(1)), []).append(path)
+
+        for version in sorted(files)[:-KEEP_VERSIONS]:
+            for path in files[version]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # Removed by a concurrent writer
+
+    #----------------------------------------------------------------------------------#
+    @staticmethod
+    def _checksum(chunk_ids: np.ndarray, partitions) -> int:
+        checksum = zlib.crc32(np.ascontiguousarray(chunk_ids, dtype=np.int64).tobytes())
+        return zlib.crc32(json.dumps(partitions).encode("utf-8"), checksum)
+
+    #----------------------------------------------------------------------------------#
+    def load(self, version: int, count: int) -> Optional[VectorIndex]:
+        """Memory-map the snapshot if it matches the collection, else return None"""
+        manifest = self.read_manifest()
+        if manifest is None:
+            logger.info("No embedding snapshot found")
+            return None
+
+        expected = {
+            "format": SNAPSHOT_FORMAT,
+            "version": version,
+            "count": count,
+            "dimension": Config.VECTOR_DIMENSION,
+            "model": Config.MODEL_NAME
+        }
+        stale = {key: manifest.get(key) for key, value in expected.items()
+                 if manifest.get(key) != value}
+        if stale:
+            logger.info(f"Embedding snapshot is stale: {stale} != collection")
+            return None
+
+        vectors_path, ids_path = self._paths(version)
+        try:
+            matrix = np.load(vectors_path, mmap_mode='r')
+            chunk_ids = np.load(ids_path)
+        except FileNotFoundError as e:
+            # Superseded and removed by other writers between reading the manifest and here
+            logger.info(f"Embedding snapshot v{version} is gone: {e.filename}")
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable embedding snapshot: {e}")
+            return None
+
+        partitions = manifest.get("partitions", [])
+        if (matrix.shape != (count, Config.VECTOR_DIMENSION)
+                or self._checksum(chunk_ids, partitions) != manifest.get("ids_checksum")):
+            logger.warning("Embedding snapshot failed its consistency check")
+            return None
+
+        logger.info(f"Memory-mapped embedding snapshot v{version}: {count} chunks")
+        return VectorIndex.from_partitions(
+            VectorPartition(doc_id, chunk_ids[start:end], matrix[start:end])
+            for doc_id, start, end in partitions
+        )
+
+#---------------------------------------------------------------------------------------#
@@ -0,0 +1,23 @@
+#---------------------------------------------------------------------------------------#
+# tokenizer_lock.py
+#---------------------------------------------------------------------------------------#
+import threading
+import weakref
+
+_locks: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_locks_guard = threading.Lock()
+
+#---------------------------------------------------------------------------------------#
+def tokenizer_lock(tokenizer) -> threading.RLock:
+    """Lock shared by every thread calling into this tokenizer.
+
+    A Hugging Face fast tokenizer is one Rust object whose truncation and padding
+    state each call may reset; concurrent calls fail with "Already borrowed".
+    """
+    with _locks_guard:
+        lock = _locks.get(tokenizer)
+        if lock is None:
+            lock = _locks[tokenizer] = threading.RLock()
+        return lock
+
+#---------------------------------------------------------------------------------------#
@@ -0,0 +1,239 @@
+#---------------------------------------------------------------------------------------#
+# vector_index.py
+#---------------------------------------------------------------------------------------#
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from loguru import logger
+import numpy as np
+from core.config import Config
+from core.embedding_codec import decode_embedding
+
+# A chunk is identified by its document and its position within that document
+ChunkKey = Tuple[str, int]
+
+#---------------------------------------------------------------------------------------#
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a float32 matrix (zero rows are left as zeros)"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+#---------------------------------------------------------------------------------------#
+class VectorPartition:
+    """Contiguous normalized embeddings of a single document.
+
+    Rows live in buffers with spare capacity that double when full, so appending
+    batch after batch costs amortized O(1) copies per row instead of an O(n)
+    vstack per batch. `chunk_ids` and `matrix` are views of the filled rows.
+    """
+
+    def __init__(self, doc_id: str, chunk_ids: Sequence[int], matrix: np.ndarray):
+        self.doc_id = doc_id
+        self._ids = np.asarray(chunk_ids, dtype=np.int64)
+        self._rows = matrix
+        self._size = len(self._ids)
+        self._positions = {cid: row for row, cid in enumerate(self._ids.tolist())}
+
+    #----------------------------------------------------------------------------------#
+    @property
+    def chunk_ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    #----------------------------------------------------------------------------------#
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._rows[:self._size]
+
+    #----------------------------------------------------------------------------------#
+    def __len__(self) -> int:
+        return self._size
+
+    #----------------------------------------------------------------------------------#
+    def _reserve(self, size: int):
+        """Make the buffers writable and large enough for size rows"""
+        capacity = len(self._ids)
+        if size <= capacity and self._rows.flags.writeable:
+            return
+        if size > capacity:
+            capacity = max(size, 2 * capacity, 16)
+        # Also copy-on-write: detaches from a shared read-only snapshot
+        ids = np.empty(capacity, dtype=np.int64)
+        rows = np.empty((capacity, self._rows.shape[1]), dtype=np.float32)
+        ids[:self._size] = self.chunk_ids
+        rows[:self._size] = self.matrix
+        self._ids, self._rows = ids, rows
+
+    #----------------------------------------------------------------------------------#
+    def upsert(self, chunk_ids: List[int], vectors: np.ndarray):
+        """Insert or replace already-normalized rows"""
+        new_rows = {}
+        for cid, vector in zip(chunk_ids, vectors):
+            if cid not in self._positions:
+                new_rows[cid] = vector
+        self._reserve(self._size + len(new_rows))
+
+        for cid in new_rows:
+            self._ids[self._size] = cid
+            self._positions[cid] = self._size
+            self._size += 1
+        for cid, vector in zip(chunk_ids, vectors):
+            self._rows[self._positions[cid]] = vector
+
+    #----------------------------------------------------------------------------------#
+    def remove(self, chunk_ids: Iterable[int]):
+        """Drop rows by chunk id (unknown ids are ignored)"""
+        keep = ~np.isin(self.chunk_ids, np.fromiter(chunk_ids, dtype=np.int64))
+        if keep.all():
+            return
+        self._ids = self.chunk_ids[keep]
+        self._rows = np.ascontiguousarray(self.matrix[keep])
+        self._size = len(self._ids)
+        self._positions = {cid: row for row, cid in enumerate(self._ids.tolist())}
+
+#---------------------------------------------------------------------------------------#
+class VectorIndex:
+    """Exact in-process cosine index over the stored chunk embeddings, partitioned by
+    document so a filtered query only scans the selected documents"""
+
+    def __init__(self, keys: Sequence[ChunkKey] = (), embeddings=None):
+        self.partitions: Dict[str, VectorPartition] = {}
+        if len(keys):
+            self.upsert(keys, embeddings)
+
+    #----------------------------------------------------------------------------------#
+    @classmethod
+    def from_partitions(cls, partitions: Iterable[VectorPartition]) -> "VectorIndex":
+        """Wrap already-normalized partitions (e.g. read-only memmap slices) without copying"""
+        index = cls()
+        index.partitions = {partition.doc_id: partition for partition in partitions}
+        return index
+
+    #----------------------------------------------------------------------------------#
+    @classmethod
+    def from_collection(cls, collection) -> "VectorIndex":
+        """Load every chunk embedding from MongoDB into per-document matrices"""
+        keys, embeddings = [], []
+        cursor = collection.find({}, {"_id": 0, "doc_id": 1, "chunk_id": 1, "embedding": 1})
+        for doc in cursor:
+            if "embedding" not in doc:
+                continue
+            keys.append((doc.get("doc_id", Config.DEFAULT_DOC_ID), doc["chunk_id"]))
+            embeddings.append(decode_embedding(doc["embedding"]))
+
+        index = cls(keys, embeddings)
+        logger.info(f"Loaded vector index: {len(index)} chunks in {len(index.partitions)} documents")
+        return index
+
+    #----------------------------------------------------------------------------------#
+    def __len__(self) -> int:
+        return sum(len(partition) for partition in self.partitions.values())
+
+    #----------------------------------------------------------------------------------#
+    def keys(self) -> List[ChunkKey]:
+        """All chunk keys, in partition order"""
+        return [(doc_id, cid) for doc_id, partition in self.partitions.items()
+                for cid in partition.chunk_ids.tolist()]
+
+    #----------------------------------------------------------------------------------#
+    def vectors(self) -> np.ndarray:
+        """All normalized embeddings stacked in keys() order (a copy)"""
+        if not self.partitions:
+            return np.zeros((0, Config.VECTOR_DIMENSION), dtype=np.float32)
+        return np.vstack([partition.matrix for partition in self.partitions.values()])
+
+    #----------------------------------------------------------------------------------#
+    def _select(self, documents: Optional[Iterable[str]]) -> List[VectorPartition]:
+        if documents is None:
+            partitions = self.partitions.values()
+        else:
+            partitions = [self.partitions[d] for d in documents if d in self.partitions]
+        return [partition for partition in partitions if len(partition)]
+
+    #----------------------------------------------------------------------------------#
+    def search(self, query_embedding, top_k: int = Config.TOP_K,
+               documents: Optional[Iterable[str]] = None) -> List[Tuple[ChunkKey, float]]:
+        """Return (chunk key, cosine score) pairs for the top_k closest chunks"""
+        return self.search_many([query_embedding], top_k, documents)[0]
+
+    #----------------------------------------------------------------------------------#
+    def search_many(self, query_embeddings, top_k: int = Config.TOP_K,
+                    documents: Optional[Iterable[str]] = None,
+                    block_size: int = 256) -> List[List[Tuple[ChunkKey, float]]]:
+        """Score a batch of queries with matrix-matrix products and return per-query hits"""
+        queries = normalize_rows(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        partitions = self._select(documents)
+        if not partitions or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        results = []
+        # Blocks of queries bound the (queries x chunks) score matrices
+        for start in range(0, len(queries), block_size):
+            block = queries[start:start + block_size]
+
+            # Top-k within each partition, then top-k over the merged candidates
+            cand_scores, cand_rows, owners = [], [], []
+            for number, partition in enumerate(partitions):
+                scores = block @ partition.matrix.T
+                k = min(top_k, len(partition))
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                cand_scores.append(np.take_along_axis(scores, top, axis=1))
+                cand_rows.append(top)
+                owners.append(np.full(k, number))
+
+            scores = np.hstack(cand_scores)
+            rows = np.hstack(cand_rows)
+            owners = np.concatenate(owners)
+
+            k = min(top_k, scores.shape[1])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            for query_top, query_rows, query_scores in zip(top, rows, top_scores):
+                hits = []
+                for column, score in zip(query_top, query_scores):
+                    partition = partitions[owners[column]]
+                    chunk_id = int(partition.chunk_ids[query_rows[column]])
+                    hits.append(((partition.doc_id, chunk_id), float(score)))
+                results.append(hits)
+        return results
+
+    #----------------------------------------------------------------------------------#
+    def upsert(self, keys: Iterable[ChunkKey], embeddings):
+        """Insert or replace embeddings without reloading the whole collection"""
+        keys = list(keys)
+        if not keys:
+            return
+        vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+        by_doc: Dict[str, List[int]] = {}
+        for row, (doc_id, _) in enumerate(keys):
+            by_doc.setdefault(doc_id, []).append(row)
+
+        for doc_id, rows in by_doc.items():
+            partition = self.partitions.get(doc_id)
+            if partition is None:
+                partition = VectorPartition(
+                    doc_id, [], np.zeros((0, vectors.shape[1]), dtype=np.float32)
+                )
+                self.partitions[doc_id] = partition
+            partition.upsert([keys[row][1] for row in rows], vectors[rows])
+
+    #----------------------------------------------------------------------------------#
+    def remove(self, keys: Iterable[ChunkKey]):
+        """Drop deleted chunks; documents left without chunks are dropped too"""
+        by_doc: Dict[str, List[int]] = {}
+        for doc_id, chunk_id in keys:
+            by_doc.setdefault(doc_id, []).append(chunk_id)
+
+        for doc_id, chunk_ids in by_doc.items():
+            partition = self.partitions.get(doc_id)
+            if partition is None:
+                continue
+            partition.remove(chunk_ids)
+            if not len(partition):
+                del self.partitions[doc_id]
+
+#---------------------------------------------------------------------------------------#
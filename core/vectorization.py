@@ -1,50 +1,370 @@
 # vectorization.py
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from itertools import islice
+import queue
+import threading
+import time
+import numpy as np
 from loguru import logger
 from core.config import Config
 from core.database import Database
+from core.embedding_backend import load_embedder, encode_bucketed, device_batch_tokens
+from core.embedding_pool import EmbeddingPool
+from core.cache import ChunkEmbeddingCache
+from core.hashing import content_hash
+from core.checkpoint import IndexCheckpoint
+
+#-------------------------------------------------------------------------------------------#
+class BatchWriter:
+    """Writer thread that stores embedded batches while the next batch is embedded.
+
+    The bounded queue provides backpressure: when MongoDB falls behind, put()
+    blocks instead of piling up embeddings in memory. With a checkpoint, progress
+    is recorded after each batch is committed, in stream order. The IVF index is
+    updated per batch but saved by the caller once the run ends
+    (Database.save_vector_index).
+    """
+
+    _DONE = object()
+
+    def __init__(self, db: Database, queue_depth: int = Config.INDEX_QUEUE_DEPTH,
+                 checkpoint: Optional[IndexCheckpoint] = None):
+        self.db = db
+        self.checkpoint = checkpoint
+        self.written = 0
+        self.write_seconds = 0.0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="chunk-writer", daemon=True)
+        self._thread.start()
+
+    #-----------------------------------------------------------------------#
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            if self._error is not None:
+                continue  # Drain so the producer never blocks after a failure
+            chunks, embeddings, position, last_chunk_id = item
+            try:
+                if chunks:
+                    start = time.perf_counter()
+                    self.db.store_chunks(chunks, embeddings, ordered=False, save_index=False)
+                    self.write_seconds += time.perf_counter() - start
+                    self.written += len(chunks)
+                if self.checkpoint is not None and position is not None:
+                    self.checkpoint.commit(position, last_chunk_id)
+            except Exception as e:
+                self._error = e
+
+    #-----------------------------------------------------------------------#
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    #-----------------------------------------------------------------------#
+    def put(self, chunks: List[Dict[str, Any]], embeddings, position: Optional[int] = None,
+            last_chunk_id=None):
+        """Queue a batch for writing (blocks while the queue is full). `position` is
+        the number of stream chunks done once it is stored (the batch may be empty)"""
+        self._raise_error()
+        self._queue.put((chunks, embeddings, position, last_chunk_id))
+
+    #-----------------------------------------------------------------------#
+    def close(self):
+        """Wait for every queued batch to be written and re-raise a write error"""
+        self._queue.put(self._DONE)
+        self._thread.join()
+        self._raise_error()
+
+    #-----------------------------------------------------------------------#
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Let the writer finish what is queued, but keep the original exception
+            self._queue.put(self._DONE)
+            self._thread.join()
 
 #-------------------------------------------------------------------------------------------#
 class VectorizationPipeline:
-    def __init__(self):
-        """Initialize the vectorization pipeline with the specified model"""
-        self.model = SentenceTransformer(Config.MODEL_NAME)
-        self.db    = Database()
-        logger.info(f"Initialized vectorization pipeline with model: {Config.MODEL_NAME}")
+    def __init__(self, workers: Optional[int] = None, use_cache: bool = True):
+        """Initialize the vectorization pipeline with the specified model.
+
+        With workers > 1 (bulk indexing), embedding runs in a pool of CPU worker
+        processes instead of an in-process model. With use_cache, chunk embeddings
+        are looked up in (and added to) the persistent embedding cache.
+        """
+        self.db = Database()
+        self.pool = None
+        self.model = None
+        self.cache = None
+        self.index_batch_size = Config.INDEX_BATCH_SIZE
+
+        if use_cache and Config.EMBEDDING_CACHE_PATH:
+            self.cache = ChunkEmbeddingCache()
+
+        if workers and workers > 1:
+            self.pool = EmbeddingPool(workers, backend=Config.EMBEDDING_BACKEND,
+                                      model_name=Config.MODEL_NAME)
+            # Large enough batches that every worker gets a share of each one
+            self.index_batch_size = Config.INDEX_BATCH_SIZE * workers
+            logger.info(f"Initialized vectorization pipeline with model: {Config.MODEL_NAME} "
+                        f"({Config.EMBEDDING_BACKEND}, {workers} worker processes)")
+            return
+
+        self.model = load_embedder(Config.EMBEDDING_BACKEND, Config.MODEL_NAME)
+        device = self.model.device.type
+        self.batch_tokens = device_batch_tokens(device)
+        logger.info(f"Initialized vectorization pipeline with model: {Config.MODEL_NAME} "
+                    f"({Config.EMBEDDING_BACKEND} on {device}, {self.batch_tokens} tokens per batch)")
     
     #-----------------------------------------------------------------------#
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a batch of text chunks"""
-        logger.info(f"Generating embeddings for {len(texts)} chunks")
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Generate float32 embeddings (one row per text, in input order).
+
+        Texts found in the embedding cache are not encoded again, and identical
+        texts are encoded once. The rest are embedded in length-sorted batches
+        under the token budget, so short texts are not padded to the length of
+        long ones; in pool mode the batches are spread over the worker processes.
+        """
         try:
-            embeddings = self.model.encode(
-                texts,
-                batch_size=Config.BATCH_SIZE,
-                show_progress_bar=True
-            )
-            return embeddings.tolist()
+            if self.cache is None:
+                logger.info(f"Generating embeddings for {len(texts)} chunks")
+                return self._encode(texts)
+
+            hashes = [content_hash(text) for text in texts]
+            found = self.cache.get_many(hashes)
+            missing = {h: text for h, text in zip(hashes, texts) if h not in found}
+            logger.info(f"Generating embeddings for {len(texts)} chunks "
+                        f"({len(texts) - len(missing)} from cache)")
+            if missing:
+                encoded = dict(zip(missing, self._encode(list(missing.values()))))
+                self.cache.put_many(encoded)
+                found.update(encoded)
+            return np.stack([found[h] for h in hashes]) if hashes else \
+                np.zeros((0, Config.VECTOR_DIMENSION), dtype=np.float32)
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             raise
+
+    #-----------------------------------------------------------------------#
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if self.pool is not None:
+            return self.pool.encode(texts)
+        return encode_bucketed(self.model, texts, self.batch_tokens)
     
     #-----------------------------------------------------------------------#
-    def process_chunks(self, chunks: List[Dict[str, Any]]):
-        """Process chunks and store with embeddings"""
+    @staticmethod
+    def batched(chunks: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """Group a (possibly streaming) chunk iterable into lists of batch_size"""
+        chunks = iter(chunks)
+        while True:
+            batch = list(islice(chunks, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    #-----------------------------------------------------------------------#
+    def process_chunks(self, chunks: Iterable[Dict[str, Any]],
+                       batch_size: Optional[int] = None,
+                       checkpoint: Optional[IndexCheckpoint] = None,
+                       resume: bool = False) -> int:
+        """Embed chunks batch by batch while a writer thread stores finished batches"""
         try:
-            # Extract text content from chunks
-            texts = [chunk['content'] for chunk in chunks]
-            
-            # Generate embeddings
-            embeddings = self.generate_embeddings(texts)
-            
-            # Store chunks with embeddings
-            self.db.store_chunks(chunks, embeddings)
-            
-            logger.info(f"Successfully processed {len(chunks)} chunks")
+            start = time.perf_counter()
+            embed_seconds = 0.0
+            position = self._resume_position(checkpoint) if resume else 0
+            if position is None:
+                return 0
+            chunks = islice(chunks, position, None)
+
+            with BatchWriter(self.db, checkpoint=checkpoint) as writer:
+                for batch in self.batched(chunks, batch_size or self.index_batch_size):
+                    # Extract text content from chunks without a precomputed embedding
+                    missing = [i for i, chunk in enumerate(batch) if chunk.get("embedding") is None]
+                    texts = [batch[i]['content'] for i in missing]
+
+                    # Generate embeddings
+                    embed_start = time.perf_counter()
+                    embeddings = [chunk.get("embedding") for chunk in batch]
+                    if texts:
+                        for i, embedding in zip(missing, self.generate_embeddings(texts)):
+                            embeddings[i] = embedding
+                    embed_seconds += time.perf_counter() - embed_start
+
+                    # Hand the batch to the writer and embed the next one
+                    position += len(batch)
+                    writer.put(batch, embeddings, position, batch[-1]["chunk_id"])
+
+            if checkpoint is not None:
+                checkpoint.complete()
+            self._log_throughput(writer, time.perf_counter() - start, embed_seconds)
+            self._log_embedding_stats()
+            return writer.written
             
         except Exception as e:
             logger.error(f"Error processing chunks: {e}")
             raise
+        finally:
+            # Once per run, also after a failure: what was stored is in the index
+            self.db.save_vector_index()
+
+    #-----------------------------------------------------------------------#
+    @staticmethod
+    def _resume_position(checkpoint: Optional[IndexCheckpoint]) -> Optional[int]:
+        """Stream chunks already committed per the checkpoint (None = file complete)"""
+        state = checkpoint.load() if checkpoint is not None else None
+        if state is None:
+            return 0
+        if state.get("complete"):
+            logger.info(f"Skipping {checkpoint.name}: already indexed")
+            return None
+        logger.info(f"Resuming {checkpoint.name} after {state['position']} chunks "
+                    f"(last chunk id {state['last_chunk_id']})")
+        return state["position"]
+
+    #-----------------------------------------------------------------------#
+    @staticmethod
+    def _log_throughput(writer: BatchWriter, seconds: float, embed_seconds: float):
+        """Log end-to-end throughput next to pure embedding and write throughput"""
+        total = writer.written
+        logger.info(f"Successfully processed {total} chunks in {seconds:.2f}s "
+                    f"({total / max(seconds, 1e-9):.1f} chunks/s; embedding "
+                    f"{embed_seconds:.2f}s, writes {writer.write_seconds:.2f}s overlapped)")
+
+    #-----------------------------------------------------------------------#
+    def _log_embedding_stats(self):
+        """Log worker pool throughput and embedding cache hit rate, where in use"""
+        if self.pool is not None:
+            self.pool.log_stats()
+        if self.cache is not None:
+            logger.info(f"Chunk embedding cache: {self.cache.stats()}")
+
+    #-----------------------------------------------------------------------#
+    def reindex_chunks(self, chunks: Iterable[Dict[str, Any]],
+                       batch_size: Optional[int] = None,
+                       dry_run: bool = False,
+                       checkpoint: Optional[IndexCheckpoint] = None,
+                       resume: bool = False) -> Dict[str, int]:
+        """Incrementally re-index chunks, embedding only new or changed content.
+
+        Chunks whose content hash and model match the stored chunk are skipped,
+        changed chunks reuse the stored embedding of identical content elsewhere
+        (e.g. a paragraph that moved), and the rest are embedded. Chunks of the
+        re-indexed documents that no longer exist are deleted at the end. The
+        collection is updated in place, so search keeps working throughout.
+        With resume, chunks committed before an interrupted run are not looked at
+        again.
+        """
+        summary = {"resumed": 0, "unchanged": 0, "new": 0, "changed": 0, "reused": 0,
+                   "precomputed": 0, "embedded": 0, "deleted": 0}
+        seen: Dict[str, set] = {}
+        # Embeddings overwritten by the previous batch, so content shifted to a
+        # later chunk id (text inserted earlier in the document) is still reused
+        overwritten: Dict[str, Any] = {}
+
+        try:
+            start = time.perf_counter()
+            embed_seconds = 0.0
+            position = self._resume_position(checkpoint) if resume else 0
+            if position is None:
+                return summary
+            chunks = iter(chunks)
+
+            # Committed chunks are skipped, but still count as present for the sweep
+            for chunk in islice(chunks, position):
+                seen.setdefault(chunk.get("doc_id", Config.DEFAULT_DOC_ID), set()).add(chunk["chunk_id"])
+                summary["resumed"] += 1
+
+            with BatchWriter(self.db, checkpoint=None if dry_run else checkpoint) as writer:
+                for batch in self.batched(chunks, batch_size or self.index_batch_size):
+                    keys = [(chunk.get("doc_id", Config.DEFAULT_DOC_ID), chunk["chunk_id"])
+                            for chunk in batch]
+                    for doc_id, chunk_id in keys:
+                        seen.setdefault(doc_id, set()).add(chunk_id)
+                    position += len(batch)
+                    states = self.db.chunk_states(keys)
+
+                    pending, moved, replaced = [], [], []
+                    for key, chunk in zip(keys, batch):
+                        chunk = {**chunk, "content_hash": content_hash(chunk["content"])}
+                        state = states.get(key)
+                        if state is None:
+                            summary["new"] += 1
+                        elif (state.get("content_hash") == chunk["content_hash"]
+                              and state.get("model") == Config.MODEL_NAME):
+                            summary["unchanged"] += 1
+                            if any(state.get(field) != chunk.get(field)
+                                   for field in ("start_char", "end_char", "length", "anchors")):
+                                moved.append(chunk)
+                            continue
+                        else:
+                            summary["changed"] += 1
+                            replaced.append(state.get("content_hash"))
+                        pending.append(chunk)
+
+                    # Identical content already embedded under another key
+                    stored = self.db.embeddings_by_hash(
+                        [chunk["content_hash"] for chunk in pending] + replaced
+                    )
+                    reusable = {**overwritten, **stored}
+                    overwritten = {h: stored[h] for h in replaced if h in stored}
+                    summary["reused"] += sum(chunk["content_hash"] in reusable for chunk in pending)
+                    # Chunk files may carry embeddings computed ahead of time
+                    for chunk in pending:
+                        if chunk["content_hash"] not in reusable and chunk.get("embedding") is not None:
+                            reusable[chunk["content_hash"]] = chunk["embedding"]
+                            summary["precomputed"] += 1
+                    to_embed = [chunk for chunk in pending if chunk["content_hash"] not in reusable]
+                    summary["embedded"] += len(to_embed)
+                    if dry_run:
+                        continue
+
+                    self.db.update_offsets(moved)
+                    embed_start = time.perf_counter()
+                    embedded = dict(zip(
+                        (chunk["content_hash"] for chunk in to_embed),
+                        self.generate_embeddings([chunk["content"] for chunk in to_embed]) if to_embed else []
+                    ))
+                    embed_seconds += time.perf_counter() - embed_start
+                    writer.put(pending, [
+                        reusable.get(chunk["content_hash"], embedded.get(chunk["content_hash"]))
+                        for chunk in pending
+                    ], position, batch[-1]["chunk_id"])
+
+            # Final sweep: chunks of these documents that were not produced this time
+            orphans = self.db.orphaned_chunks(seen)
+            summary["deleted"] = len(orphans)
+            if orphans and not dry_run:
+                self.db.delete_chunks(orphans, save_index=False)
+
+            if not dry_run:
+                if checkpoint is not None:
+                    checkpoint.complete()
+                self._log_throughput(writer, time.perf_counter() - start, embed_seconds)
+                self._log_embedding_stats()
+            logger.info(f"{'Dry run' if dry_run else 'Re-index'} summary: {summary}")
+            return summary
+
+        except Exception as e:
+            logger.error(f"Error re-indexing chunks: {e}")
+            raise
+        finally:
+            self.db.save_vector_index()
+
+    #-----------------------------------------------------------------------#
+    def close(self):
+        """Stop the embedding worker pool and close the embedding cache, if any"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
 
 #-------------------------------------------------------------------------------------------#
@@ -0,0 +1,34 @@
+#---------------------------------------------------------------------------------------#
+# conftest.py
+#---------------------------------------------------------------------------------------#
+import mongomock
+import numpy as np
+import pytest
+import core.database
+from core.config import Config
+from core.database import Database
+
+#---------------------------------------------------------------------------------------#
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Database on an in-memory mongomock server; relative data paths (snapshot,
+    IVF index) resolve under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(core.database, "MongoClient", mongomock.MongoClient)
+    database = Database()
+    database.ensure_indexes()
+    yield database
+    database.close()
+
+#---------------------------------------------------------------------------------------#
+@pytest.fixture
+def make_chunks():
+    """Chunks of a document with random embeddings: make_chunks(doc_id, ids, seed)"""
+    def make(doc_id, chunk_ids, seed=0):
+        chunk_ids = list(chunk_ids)
+        rng = np.random.default_rng(seed)
+        chunks = [{"doc_id": doc_id, "chunk_id": cid, "content": f"{doc_id} chunk {cid}",
+                   "start_char": 10 * cid, "end_char": 10 * cid + 9, "length": 9}
+                  for cid in chunk_ids]
+        return chunks, rng.normal(size=(len(chunk_ids), Config.VECTOR_DIMENSION)).astype(np.float32)
+    return make
@@ -0,0 +1,98 @@
+#---------------------------------------------------------------------------------------#
+# test_ann_index.py
+#---------------------------------------------------------------------------------------#
+import numpy as np
+import pytest
+from core.ann_index import IVFIndex
+from core.config import Config
+from core.vector_index import VectorIndex
+
+#---------------------------------------------------------------------------------------#
+@pytest.fixture
+def clustered():
+    """2000 keys with embeddings drawn around 50 topics, split over two documents"""
+    rng = np.random.default_rng(0)
+    topics = rng.normal(size=(50, Config.VECTOR_DIMENSION))
+    noise = rng.normal(size=(2000, Config.VECTOR_DIMENSION))
+    vectors = topics[rng.integers(0, 50, 2000)] + 0.3 * noise
+    keys = [("even" if i % 2 == 0 else "odd", i) for i in range(2000)]
+    return keys, vectors.astype(np.float32)
+
+#---------------------------------------------------------------------------------------#
+def recall(ann, exact, queries, top_k=10):
+    found = 0
+    for query in queries:
+        truth = {key for key, _ in exact.search(query, top_k)}
+        found += len(truth & {key for key, _ in ann.search(query, top_k)})
+    return found / (top_k * len(queries))
+
+#---------------------------------------------------------------------------------------#
+def test_recall_against_exact_search(clustered):
+    keys, vectors = clustered
+    exact = VectorIndex(keys, vectors)
+    ann = IVFIndex.train(keys, vectors, nlist=32, nprobe=8)
+    assert ann.trained and len(ann) == 2000
+
+    assert recall(ann, exact, vectors[:100]) >= 0.9
+    # Probing every list is exact
+    assert [key for key, _ in ann.search(vectors[0], 10, nprobe=32)] == \
+        [key for key, _ in exact.search(vectors[0], 10)]
+
+#---------------------------------------------------------------------------------------#
+def test_document_filter_keeps_full_recall(clustered):
+    keys, vectors = clustered
+    exact = VectorIndex(keys, vectors)
+    ann = IVFIndex.train(keys, vectors, nlist=32, nprobe=1)
+
+    for query in vectors[:20]:
+        hits = ann.search(query, 5, documents=["odd"])
+        expected = exact.search(query, 5, documents=["odd"])
+        assert [key for key, _ in hits] == [key for key, _ in expected]
+
+#---------------------------------------------------------------------------------------#
+def test_untrained_until_min_train_size(clustered, monkeypatch):
+    monkeypatch.setattr(Config, "IVF_MIN_TRAIN_SIZE", 1000)
+    keys, vectors = clustered
+    ann = IVFIndex.train(keys[:500], vectors[:500], nlist=16)
+    assert not ann.trained
+    assert ann.search(vectors[7], 1)[0][0] == keys[7]
+
+    ann.upsert(keys[500:], vectors[500:])
+    assert ann.trained and len(ann.centroids) == 16
+    assert ann.search(vectors[1500], 1)[0][0] == keys[1500]
+
+#---------------------------------------------------------------------------------------#
+def test_incremental_upsert_and_remove(clustered):
+    keys, vectors = clustered
+    ann = IVFIndex.train(keys, vectors, nlist=32, nprobe=32)
+
+    # Replacing an embedding moves the key; it is not duplicated
+    ann.upsert([keys[0]], vectors[1][None])
+    assert len(ann) == 2000
+    assert {key for key, _ in ann.search(vectors[1], 2)} == {keys[0], keys[1]}
+
+    ann.remove([keys[1], ("missing", 0)])
+    assert len(ann) == 1999
+    assert keys[1] not in {key for key, _ in ann.search(vectors[1], 5)}
+
+    # A removed key can come back
+    ann.upsert([keys[1]], vectors[1][None])
+    assert ann.search(vectors[1], 1)[0][0] in {keys[0], keys[1]}
+    assert len(ann) == 2000
+
+#---------------------------------------------------------------------------------------#
+def test_save_and_load_round_trip(clustered, tmp_path):
+    keys, vectors = clustered
+    ann = IVFIndex.train(keys, vectors, nlist=32, nprobe=4)
+    ann.remove(keys[:10])
+    path = str(tmp_path / "ivf.npz")
+    assert IVFIndex.saved_version(path) is None
+
+    ann.save(path, version=3)
+    loaded = IVFIndex.load(path)
+    assert IVFIndex.saved_version(path) == 3 and loaded.version == 3
+    assert len(loaded) == 1990 and loaded.nprobe == 4
+    for query in vectors[:20]:
+        assert loaded.search(query, 5) == ann.search(query, 5)
+        assert loaded.search(query, 5, documents=["even"]) == \
+            ann.search(query, 5, documents=["even"])
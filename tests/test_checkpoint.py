@@ -0,0 +1,33 @@
+#---------------------------------------------------------------------------------------#
+# test_checkpoint.py
+#---------------------------------------------------------------------------------------#
+from core.checkpoint import IndexCheckpoint
+
+#---------------------------------------------------------------------------------------#
+def test_checkpoint_applies_only_to_the_same_input_and_model(db, tmp_path):
+    source = tmp_path / "book.jsonl"
+    source.write_text("chunks v1")
+    checkpoint = IndexCheckpoint(db.metadata, "book", str(source))
+    assert checkpoint.load() is None
+
+    checkpoint.commit(256, 255)
+    state = IndexCheckpoint(db.metadata, "book", str(source)).load()
+    assert (state["position"], state["last_chunk_id"], state["complete"]) == (256, 255, False)
+    assert IndexCheckpoint(db.metadata, "book", str(source), model_name="other").load() is None
+
+    source.write_text("chunks v2")
+    assert IndexCheckpoint(db.metadata, "book", str(source)).load() is None
+
+#---------------------------------------------------------------------------------------#
+def test_complete_and_clear_all(db, tmp_path):
+    source = tmp_path / "book.jsonl"
+    source.write_text("chunks")
+    checkpoint = IndexCheckpoint(db.metadata, "book", str(source))
+    checkpoint.commit(10, 9)
+    checkpoint.complete()
+    assert checkpoint.load()["complete"]
+
+    IndexCheckpoint(db.metadata, "other", str(source)).commit(1, 0)
+    db.metadata.insert_one({"_id": "not-a-checkpoint"})
+    assert IndexCheckpoint.clear_all(db.metadata) == 2
+    assert db.metadata.find_one({"_id": "not-a-checkpoint"}) is not None
@@ -0,0 +1,30 @@
+#---------------------------------------------------------------------------------------#
+# test_context.py
+#---------------------------------------------------------------------------------------#
+from core.context import merge_spans
+
+SOURCE = "Vitamin C supports the immune system. Niacin lowers cholesterol."
+
+#---------------------------------------------------------------------------------------#
+def chunk(chunk_id, start, end, score=0.0):
+    return {"doc_id": "book", "chunk_id": chunk_id, "content": " ".join(SOURCE[start:end].split()),
+            "start_char": start, "end_char": end, "score": score}
+
+#---------------------------------------------------------------------------------------#
+def test_chunks_split_inside_a_token_merge_without_a_space():
+    middle = SOURCE.index("immune") + 3
+    [passage] = merge_spans([chunk(0, 0, middle), chunk(1, middle, len(SOURCE))])
+    assert passage["content"] == SOURCE
+
+#---------------------------------------------------------------------------------------#
+def test_chunks_split_at_whitespace_merge_with_one_space():
+    gap = SOURCE.index(" Niacin")
+    [passage] = merge_spans([chunk(1, gap + 1, len(SOURCE)), chunk(0, 0, gap)])
+    assert passage["content"] == SOURCE
+    assert passage["chunk_ids"] == [0, 1]
+
+#---------------------------------------------------------------------------------------#
+def test_overlapping_chunks_keep_the_shared_text_once():
+    [passage] = merge_spans([chunk(0, 0, 40, 0.2), chunk(1, 26, len(SOURCE), 0.7)])
+    assert passage["content"] == SOURCE
+    assert passage["score"] == 0.7
@@ -0,0 +1,71 @@
+#---------------------------------------------------------------------------------------#
+# test_database.py
+#---------------------------------------------------------------------------------------#
+import pytest
+from core.ann_index import IVFIndex
+from core.config import Config
+from core.database import Database
+
+#---------------------------------------------------------------------------------------#
+@pytest.mark.parametrize("vector_index", ["exact", "ivf"])
+def test_empty_collection_can_be_indexed_and_searched(db, make_chunks, monkeypatch, vector_index):
+    monkeypatch.setattr(Config, "VECTOR_INDEX", vector_index)
+    assert len(db.vector_index) == 0
+
+    chunks, embeddings = make_chunks("book", range(20))
+    db.store_chunks(chunks, embeddings)
+
+    hits = db.vector_search(embeddings[3], top_k=2)
+    assert hits[0][0] == ("book", 3)
+    assert len(db.vector_index) == 20
+    if vector_index == "ivf":
+        assert IVFIndex.load(Config.IVF_INDEX_PATH).version == db.embeddings_version()
+
+#---------------------------------------------------------------------------------------#
+def test_connecting_does_not_migrate(db):
+    db.collection.drop_indexes()
+    db.collection.insert_one({"chunk_id": 0, "content": "old"})
+    db.collection.create_index("chunk_id")
+
+    Database()
+    assert "chunk_id_1" in db.collection.index_information()
+    assert "doc_id" not in db.collection.find_one()
+
+    db.ensure_indexes()
+    db.ensure_indexes()
+    assert "chunk_id_1" not in db.collection.index_information()
+    assert db.collection.find_one()["doc_id"] == Config.DEFAULT_DOC_ID
+    assert "content_hash" in db.collection.find_one()
+
+#---------------------------------------------------------------------------------------#
+def test_delete_documents_drops_their_chunks_from_the_index(db, make_chunks):
+    for doc_id, seed in (("kept", 0), ("gone", 1)):
+        db.store_chunks(*make_chunks(doc_id, range(5), seed))
+    _, embeddings = make_chunks("gone", range(5), 1)
+    assert len(db.vector_index) == 10
+
+    assert db.delete_documents(["gone"]) == 5
+    assert db.list_documents() == {"kept": 5}
+    assert all(key[0] == "kept" for key, _ in db.vector_search(embeddings[0], top_k=5))
+
+#---------------------------------------------------------------------------------------#
+def test_search_picks_up_embeddings_changed_by_another_process(db, make_chunks, monkeypatch):
+    monkeypatch.setattr(Config, "INDEX_VERSION_CHECK", 0.0)
+    writer = Database()
+    writer.collection, writer.metadata = db.collection, db.metadata
+
+    writer.store_chunks(*make_chunks("first", range(5)))
+    assert len(db.vector_index) == 5
+
+    # Mid-run (no snapshot yet) the loaded index keeps serving, then it is rebuilt
+    chunks, embeddings = make_chunks("second", range(5), seed=1)
+    writer.store_chunks(chunks, embeddings)
+    assert db.vector_search(embeddings[0], top_k=1)[0][0][0] == "first"
+    assert db.vector_search(embeddings[0], top_k=1)[0][0] == ("second", 0)
+
+    # A finished run leaves a snapshot, which is picked up at once
+    chunks, embeddings = make_chunks("third", range(5), seed=2)
+    writer.store_chunks(chunks, embeddings)
+    writer.write_snapshot()
+    assert db.vector_search(embeddings[4], top_k=1)[0][0] == ("third", 4)
+    assert len(db.vector_index) == 15
@@ -0,0 +1,57 @@
+#---------------------------------------------------------------------------------------#
+# test_embedding_codec.py
+#---------------------------------------------------------------------------------------#
+import numpy as np
+import pytest
+from bson.binary import Binary
+from core.config import Config
+from core.embedding_codec import decode_embedding, encode_embedding, storage_format
+
+#---------------------------------------------------------------------------------------#
+@pytest.mark.parametrize("storage, size", [
+    ("array", None),
+    ("float16", 2 * Config.VECTOR_DIMENSION),
+    ("int8", 8 + Config.VECTOR_DIMENSION)  # scale and offset, then one byte per value
+])
+def test_round_trip(storage, size):
+    vector = np.random.default_rng(0).normal(size=Config.VECTOR_DIMENSION).astype(np.float32)
+    stored = encode_embedding(vector, storage)
+    assert storage_format(stored) == storage
+    if size is not None:
+        assert isinstance(stored, Binary) and len(stored) == size
+
+    decoded = decode_embedding(stored)
+    assert decoded.dtype == np.float32 and decoded.shape == vector.shape
+    bound = {
+        "array": 0.0,
+        "float16": 1e-3 * np.abs(vector).max(),
+        "int8": (vector.max() - vector.min()) / 255 / 2 + 1e-6  # Half a quantization step
+    }[storage]
+    assert np.abs(decoded - vector).max() <= bound
+    cosine = decoded @ vector / (np.linalg.norm(decoded) * np.linalg.norm(vector))
+    assert cosine > 0.999
+
+#---------------------------------------------------------------------------------------#
+def test_constant_vector_and_unknown_formats():
+    decoded = decode_embedding(encode_embedding(np.full(4, 0.25), "int8"))
+    assert np.allclose(decoded, 0.25)
+
+    with pytest.raises(ValueError):
+        encode_embedding(np.zeros(4), "bfloat16")
+    with pytest.raises(ValueError):
+        decode_embedding(Binary(b"\0" * 8, 0x90))
+
+#---------------------------------------------------------------------------------------#
+def test_migrated_collection_searches_the_same(db, make_chunks):
+    chunks, embeddings = make_chunks("book", range(50))
+    db.store_chunks(chunks, embeddings)
+    before = [key for key, _ in db.vector_index.search(embeddings[0], top_k=5)]
+    version = db.embeddings_version()
+
+    assert db.migrate_embeddings("int8") == 50
+    assert db.migrate_embeddings("int8") == 0
+    assert db.embeddings_version() > version
+    assert {storage_format(doc["embedding"]) for doc in db.collection.find()} == {"int8"}
+
+    db.reset_vector_index()
+    assert [key for key, _ in db.vector_index.search(embeddings[0], top_k=5)] == before
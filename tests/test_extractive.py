@@ -0,0 +1,61 @@
+#---------------------------------------------------------------------------------------#
+# test_extractive.py
+#---------------------------------------------------------------------------------------#
+import os
+import pytest
+from core.data_ingestion import iter_chunks, iter_token_chunks
+from core.extractive import split_sentences
+
+SOURCE = os.path.join(os.path.dirname(__file__), "..", "source", "The-Gerson-Therapy-Reduced.txt")
+
+#---------------------------------------------------------------------------------------#
+class WhitespaceTokenizer:
+    """Stand-in for the model tokenizer: one token per word"""
+
+    def __call__(self, texts, add_special_tokens=False):
+        return {"input_ids": [[0] * len(text.split()) for text in texts]}
+
+#---------------------------------------------------------------------------------------#
+@pytest.fixture
+def ragged_source(tmp_path):
+    path = tmp_path / "ragged.txt"
+    path.write_text(
+        "  Vitamin C   supports\n\n\tthe immune system.   Niacin lowers\n"
+        "cholesterol in many patients!\n\n\n\n     Zinc is needed    for wound healing.\n" * 40,
+        encoding="utf-8"
+    )
+    return str(path)
+
+#---------------------------------------------------------------------------------------#
+def assert_sentences_point_into_source(chunks, source):
+    sentences = split_sentences(chunks, min_chars=1)
+    assert sentences
+    for sentence in sentences:
+        span = source[sentence["start_char"]:sentence["end_char"]]
+        # Chunk content is whitespace-normalized, the source span is raw text
+        assert " ".join(span.split()) == sentence["text"]
+        assert span == span.strip()
+
+#---------------------------------------------------------------------------------------#
+def test_char_chunk_sentences_point_into_source(ragged_source):
+    with open(ragged_source, encoding="utf-8") as f:
+        source = f.read()
+    chunks = list(iter_chunks(ragged_source, chunk_size=200, overlap=40, block_size=64))
+    assert_sentences_point_into_source(chunks, source)
+
+#---------------------------------------------------------------------------------------#
+def test_token_chunk_sentences_point_into_source(ragged_source):
+    with open(ragged_source, encoding="utf-8") as f:
+        source = f.read()
+    chunks = list(iter_token_chunks(ragged_source, max_tokens=40, overlap=8,
+                                    tokenizer=WhitespaceTokenizer(), block_size=64))
+    assert_sentences_point_into_source(chunks, source)
+
+#---------------------------------------------------------------------------------------#
+@pytest.mark.skipif(not os.path.exists(SOURCE), reason="reference book not available")
+def test_reference_book_sentences_point_into_source():
+    with open(SOURCE, encoding="utf-8") as f:
+        source = f.read()
+    assert_sentences_point_into_source(list(iter_chunks(SOURCE)), source)
+
+#---------------------------------------------------------------------------------------#
@@ -0,0 +1,91 @@
+#---------------------------------------------------------------------------------------#
+# test_snapshot.py
+#---------------------------------------------------------------------------------------#
+import json
+import os
+import numpy as np
+import pytest
+from core.snapshot import KEEP_VERSIONS, EmbeddingSnapshot
+from core.vector_index import VectorIndex
+
+#---------------------------------------------------------------------------------------#
+@pytest.fixture
+def index(make_chunks):
+    keys, vectors = [], []
+    for seed, doc_id in enumerate(["b", "a"]):
+        chunks, embeddings = make_chunks(doc_id, range(10), seed=seed)
+        keys += [(doc_id, chunk["chunk_id"]) for chunk in chunks]
+        vectors.append(embeddings)
+    return VectorIndex(keys, np.vstack(vectors))
+
+#---------------------------------------------------------------------------------------#
+def test_load_is_a_read_only_memory_map_of_the_index(index, tmp_path):
+    snapshot = EmbeddingSnapshot(str(tmp_path))
+    assert snapshot.load(1, len(index)) is None
+
+    snapshot.write(index, 1)
+    loaded = snapshot.load(1, len(index))
+    assert sorted(loaded.keys()) == sorted(index.keys())
+    assert isinstance(loaded.partitions["a"].matrix, np.memmap)
+    assert not loaded.partitions["a"].matrix.flags.writeable
+    query = index.partitions["b"].matrix[4]
+    assert [key for key, _ in loaded.search(query, 3)] == \
+        [key for key, _ in index.search(query, 3)]
+    assert loaded.search(query, 1, documents=["a"])[0][0][0] == "a"
+
+#---------------------------------------------------------------------------------------#
+def test_stale_snapshots_are_not_loaded(index, tmp_path):
+    snapshot = EmbeddingSnapshot(str(tmp_path))
+    snapshot.write(index, 2)
+
+    assert snapshot.load(3, len(index)) is None       # Re-indexed since
+    assert snapshot.load(2, len(index) + 1) is None   # Chunk count changed
+
+    manifest = snapshot.read_manifest()
+    manifest["partitions"][0][0] = "renamed"
+    with open(snapshot.manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    assert snapshot.load(2, len(index)) is None       # Fails the checksum
+
+#---------------------------------------------------------------------------------------#
+def test_write_replaces_atomically_and_prunes_old_versions(index, tmp_path):
+    snapshot = EmbeddingSnapshot(str(tmp_path))
+    for version in range(1, 5):
+        snapshot.write(index, version)
+    mapped = snapshot.load(4, len(index))
+
+    files = sorted(os.listdir(tmp_path))
+    assert not [name for name in files if name.endswith(".tmp")]
+    kept = [f"{prefix}-v{version}.npy" for version in range(5 - KEEP_VERSIONS, 5)
+            for prefix in ("chunk_ids", "embeddings")]
+    assert files == sorted(kept + ["manifest.json"])
+
+    # A reader that mapped a version keeps it after newer writes prune it
+    for version in range(5, 5 + KEEP_VERSIONS):
+        snapshot.write(index, version)
+    assert not os.path.exists(tmp_path / "embeddings-v4.npy")
+    assert len(mapped.search(index.partitions["a"].matrix[0], 2)) == 2
+
+#---------------------------------------------------------------------------------------#
+def test_missing_files_are_not_loaded(index, tmp_path):
+    snapshot = EmbeddingSnapshot(str(tmp_path))
+    snapshot.write(index, 1)
+    os.remove(tmp_path / "embeddings-v1.npy")
+    assert snapshot.load(1, len(index)) is None
+
+#---------------------------------------------------------------------------------------#
+def test_database_rebuilds_a_stale_snapshot(db, make_chunks):
+    chunks, embeddings = make_chunks("book", range(20))
+    db.store_chunks(chunks, embeddings)
+    db.write_snapshot()
+    version = db.embeddings_version()
+    assert EmbeddingSnapshot().read_manifest()["version"] == version
+
+    # Another writer changed the collection without writing a snapshot
+    db.collection.delete_one({"doc_id": "book", "chunk_id": 19})
+    db._bump_embeddings_version()
+    db.reset_vector_index()
+
+    assert len(db.vector_index) == 19
+    manifest = EmbeddingSnapshot().read_manifest()
+    assert (manifest["version"], manifest["count"]) == (db.embeddings_version(), 19)
@@ -0,0 +1,52 @@
+#---------------------------------------------------------------------------------------#
+# test_vector_index.py
+#---------------------------------------------------------------------------------------#
+import numpy as np
+from core.vector_index import VectorIndex, normalize_rows
+
+#---------------------------------------------------------------------------------------#
+def build_index(make_chunks):
+    keys, vectors = [], []
+    for seed, doc_id in enumerate(["a", "b", "c"]):
+        chunks, embeddings = make_chunks(doc_id, range(30), seed=seed)
+        keys += [(chunk["doc_id"], chunk["chunk_id"]) for chunk in chunks]
+        vectors.append(embeddings)
+    return VectorIndex(keys, np.vstack(vectors)), keys, np.vstack(vectors)
+
+#---------------------------------------------------------------------------------------#
+def test_search_many_matches_brute_force(make_chunks):
+    index, keys, vectors = build_index(make_chunks)
+    queries = np.random.default_rng(7).normal(size=(5, vectors.shape[1]))
+
+    results = index.search_many(queries, top_k=4, block_size=2)
+    scores = normalize_rows(queries.astype(np.float32)) @ normalize_rows(vectors).T
+    for query, hits in enumerate(results):
+        expected = np.argsort(-scores[query])[:4]
+        assert [key for key, _ in hits] == [keys[row] for row in expected]
+        assert np.allclose([score for _, score in hits], scores[query, expected], atol=1e-5)
+        single = index.search(queries[query], top_k=4)
+        assert [key for key, _ in hits] == [key for key, _ in single]
+
+#---------------------------------------------------------------------------------------#
+def test_documents_filter_only_scans_selected_partitions(make_chunks):
+    index, keys, vectors = build_index(make_chunks)
+
+    hits = index.search(vectors[keys.index(("a", 5))], top_k=10, documents=["b", "c"])
+    assert len(hits) == 10
+    assert {doc_id for (doc_id, _), _ in hits} <= {"b", "c"}
+    assert index.search(vectors[0], documents=["missing"]) == []
+    assert index.search(vectors[0], documents=["a"])[0][0] == ("a", 0)
+
+#---------------------------------------------------------------------------------------#
+def test_upsert_replaces_and_remove_drops_empty_documents(make_chunks):
+    index, keys, vectors = build_index(make_chunks)
+
+    index.upsert([("a", 0)], vectors[keys.index(("b", 3))][None])
+    assert len(index) == 90
+    assert {key for key, _ in index.search(vectors[keys.index(("b", 3))], top_k=2)} == \
+        {("a", 0), ("b", 3)}
+
+    index.remove([("c", cid) for cid in range(30)] + [("a", 1), ("missing", 0)])
+    assert "c" not in index.partitions
+    assert len(index) == 59
+    assert ("a", 1) not in index.keys()
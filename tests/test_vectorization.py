@@ -0,0 +1,92 @@
+#---------------------------------------------------------------------------------------#
+# test_vectorization.py
+#---------------------------------------------------------------------------------------#
+import types
+import zlib
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+import core.vectorization
+from core.checkpoint import IndexCheckpoint
+from core.config import Config
+from core.vectorization import VectorizationPipeline
+
+#---------------------------------------------------------------------------------------#
+@pytest.fixture
+def pipeline(db, monkeypatch):
+    """Pipeline on the test database with a fake model. `pipeline.calls` records the
+    texts of every encode call; encoding fails after `pipeline.fail_after` calls"""
+    def encode(model, texts, batch_tokens):
+        if pipeline.fail_after is not None and len(pipeline.calls) >= pipeline.fail_after:
+            raise RuntimeError("embedding failed")
+        pipeline.calls.append(list(texts))
+        return np.stack([np.random.default_rng(zlib.crc32(text.encode())).normal(
+            size=Config.VECTOR_DIMENSION).astype(np.float32) for text in texts])
+
+    fake_model = types.SimpleNamespace(device=types.SimpleNamespace(type="cpu"))
+    monkeypatch.setattr(core.vectorization, "load_embedder", lambda *args: fake_model)
+    monkeypatch.setattr(core.vectorization, "encode_bucketed", encode)
+    pipeline = VectorizationPipeline(use_cache=False)
+    pipeline.db = db
+    pipeline.calls, pipeline.fail_after = [], None
+    yield pipeline
+    pipeline.close()
+
+#---------------------------------------------------------------------------------------#
+def chunks_of(texts, doc_id="book"):
+    return [{"doc_id": doc_id, "chunk_id": cid, "content": text, "start_char": 0,
+             "end_char": len(text), "length": len(text)} for cid, text in enumerate(texts)]
+
+#---------------------------------------------------------------------------------------#
+def test_reindex_skips_unchanged_reuses_moved_and_deletes_orphans(pipeline, db):
+    texts = [f"paragraph {i}" for i in range(8)]
+    summary = pipeline.reindex_chunks(chunks_of(texts), batch_size=3)
+    assert (summary["new"], summary["embedded"]) == (8, 8)
+
+    summary = pipeline.reindex_chunks(chunks_of(texts), batch_size=3)
+    assert (summary["unchanged"], summary["embedded"], summary["deleted"]) == (8, 0, 0)
+
+    # Paragraph 2 is rewritten and paragraph 3 deleted: paragraphs 4-6 move up one
+    # chunk id (their embeddings are reused) and chunk ids 6 and 7 are orphaned
+    edited = texts[:2] + ["rewritten"] + texts[4:7]
+    pipeline.calls.clear()
+    summary = pipeline.reindex_chunks(chunks_of(edited), batch_size=3)
+    assert summary["changed"] == 4 and summary["reused"] == 3
+    assert (summary["embedded"], summary["deleted"]) == (1, 2)
+    assert pipeline.calls == [["rewritten"]]
+    assert db.collection.count_documents({}) == 6
+    hits = db.vector_search(pipeline.generate_embeddings(["paragraph 4"])[0], top_k=1)
+    assert hits[0][0] == ("book", 3)
+
+#---------------------------------------------------------------------------------------#
+def test_dry_run_writes_nothing(pipeline, db):
+    summary = pipeline.reindex_chunks(chunks_of(["a", "b"]), dry_run=True)
+    assert (summary["new"], summary["embedded"]) == (2, 2)
+    assert pipeline.calls == [] and db.collection.count_documents({}) == 0
+
+#---------------------------------------------------------------------------------------#
+def test_resume_continues_after_the_last_committed_batch(pipeline, db, tmp_path):
+    source = tmp_path / "book.jsonl"
+    source.write_text("chunks")
+    texts = [f"paragraph {i}" for i in range(9)]
+
+    pipeline.fail_after = 1
+    with pytest.raises(RuntimeError):
+        pipeline.reindex_chunks(chunks_of(texts), batch_size=3,
+                                checkpoint=IndexCheckpoint(db.metadata, "book", str(source)))
+    assert IndexCheckpoint(db.metadata, "book", str(source)).load()["position"] == 3
+    assert db.collection.count_documents({}) == 3
+
+    pipeline.fail_after = None
+    pipeline.calls.clear()
+    summary = pipeline.reindex_chunks(chunks_of(texts), batch_size=3, resume=True,
+                                      checkpoint=IndexCheckpoint(db.metadata, "book", str(source)))
+    assert (summary["resumed"], summary["new"], summary["deleted"]) == (3, 6, 0)
+    assert sum(pipeline.calls, []) == texts[3:]
+    assert db.collection.count_documents({}) == 9
+
+    # A completed file is skipped entirely
+    summary = pipeline.reindex_chunks(chunks_of(texts), resume=True,
+                                      checkpoint=IndexCheckpoint(db.metadata, "book", str(source)))
+    assert not any(summary.values())